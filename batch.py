@@ -0,0 +1,84 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from compiled_schema import compile_schema
+from query_cache import cached_transform_query, use_disk_cache
+
+# Set once per worker process by the pool initializer
+_worker_schema = None
+_worker_options = {}
+
+
+def _init_worker(schema, options, disk_cache=None):
+    global _worker_schema, _worker_options
+    _worker_schema = schema
+    _worker_options = options
+    if disk_cache is not None:
+        use_disk_cache(disk_cache)
+
+
+def _transform_one(input_query, schema, options):
+    try:
+        transformed = cached_transform_query(input_query, schema, **options)
+    except Exception as e:
+        return {"sql": None, "error": f"{type(e).__name__}: {e}"}
+    if isinstance(transformed, tuple):
+        sql, params = transformed
+        return {"sql": sql, "params": params, "error": None}
+    return {"sql": transformed, "error": None}
+
+
+def _transform_in_worker(input_query, options):
+    return _transform_one(input_query, _worker_schema, options)
+
+
+def _transform_chunk(queries):
+    return [_transform_one(query, _worker_schema, _worker_options) for query in queries]
+
+
+def _chunks(queries, chunksize):
+    iterator = iter(queries)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_transform_many(queries, schema, workers=None, chunksize=256, disk_cache=None, **options):
+    """
+    Rewrites queries in worker processes, yielding one result per query in input order.
+
+    Each result is a dict with "sql" and "error", plus "params" when the `parameterize`
+    option is set; a failing query does not stop the batch.
+    The compiled schema is sent to every worker once, and at most two chunks per worker
+    are in flight, so arbitrarily long iterables run in bounded memory. `disk_cache` is the
+    path of a DiskCache the workers share, so templates outlive them.
+    """
+    schema = compile_schema(schema)
+    workers = os.cpu_count() if workers is None else workers
+
+    if workers <= 1:
+        if disk_cache is not None:
+            use_disk_cache(disk_cache)
+        for query in queries:
+            yield _transform_one(query, schema, options)
+        return
+
+    initargs = (schema, options, disk_cache)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending = deque()
+        for chunk in _chunks(queries, chunksize):
+            pending.append(pool.submit(_transform_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def transform_many(queries, schema, workers=None, chunksize=256, disk_cache=None, **options):
+    return list(
+        iter_transform_many(queries, schema, workers=workers, chunksize=chunksize, disk_cache=disk_cache, **options)
+    )
@@ -0,0 +1,202 @@
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from time import perf_counter
+
+import sqlglot
+
+from batch import transform_many
+from main import transform_query
+from query_cache import QueryCache, cached_transform_query
+
+CHAIN_DEPTH = 6
+TABLE_WIDTH = 64
+
+
+def synthetic_schema(depth=CHAIN_DEPTH, width=TABLE_WIDTH):
+    """
+    A chain of `depth` objects t0 <- t1 <- ... each with `width` plain columns c0..c<width-1>.
+
+    Every t<n+1> holds a foreign key `parent` to t<n>, and t<n> sees its rows through the
+    virtual relation `children`, so `children.children.c1` on t0 is a three-level chain.
+    """
+    schema = {}
+    for level in range(depth):
+        columns = {"id": f"t{level}_id"}
+        columns.update({f"c{index}": f"t{level}_col_{index}" for index in range(width)})
+        if level > 0:
+            columns["parent"] = {"relation": {"object": f"t{level - 1}", "column": "id", "virtual": False}}
+        if level < depth - 1:
+            columns["children"] = {"relation": {"object": f"t{level + 1}", "column": "parent", "virtual": True}}
+        schema[f"t{level}"] = {"physical_name": f"table_{level}", "is_public": True, "columns": columns}
+    return schema
+
+
+def where_tree(predicates):
+    # c0 > 0 AND c1 = 'v1' OR c2 < 2 AND ...: alternating operators over cycling columns
+    parts = []
+    for index in range(predicates):
+        column = f"c{index % TABLE_WIDTH}"
+        value = f"'v{index}'" if index % 2 else str(index)
+        operator = ("=", ">", "<", "!=")[index % 4]
+        if index:
+            parts.append("OR" if index % 3 == 0 else "AND")
+        parts.append(f"{column} {operator} {value}")
+    return " ".join(parts)
+
+
+def workloads():
+    """Returns {name: query} for every synthetic workload."""
+    queries = {"single_table": "SELECT c0, c1, c2 FROM t0 WHERE c3 > 5 AND c4 = 'active'"}
+    for levels in range(2, CHAIN_DEPTH + 1):
+        path = ".".join(["children"] * (levels - 1))
+        queries[f"chain_{levels}"] = f"SELECT c0, c1 FROM t0 WHERE {path}.c1 > 5 AND c2 = 'active'"
+    for predicates in (1, 10, 100, 1000):
+        queries[f"where_{predicates}"] = f"SELECT c0 FROM t0 WHERE {where_tree(predicates)}"
+    for width in (16, TABLE_WIDTH):
+        columns = ", ".join(f"c{index}" for index in range(width))
+        queries[f"select_{width}"] = f"SELECT {columns} FROM t0 WHERE c0 > 5"
+    return queries
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _peak_memory(call):
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(call, iterations, warmup=3):
+    """
+    Times `call` `iterations` times after `warmup` untimed calls.
+
+    Returns:
+        dict: throughput (calls/s), p50/p99 latency (s) and peak traced memory (bytes) of one
+        extra call; memory is measured separately because tracemalloc slows every allocation.
+    """
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(iterations):
+        started = perf_counter()
+        call()
+        samples.append(perf_counter() - started)
+    return {
+        "iterations": iterations,
+        "throughput": iterations / sum(samples),
+        "p50": _percentile(samples, 0.5),
+        "p99": _percentile(samples, 0.99),
+        "peak_memory": _peak_memory(call),
+    }
+
+
+def _iterations(name, iterations):
+    # The 1,000-predicate tree is ~1000x the work of the others; keep its run time comparable
+    if name == "where_1000":
+        return max(1, iterations // 20)
+    if name == "where_100":
+        return max(1, iterations // 4)
+    return iterations
+
+
+def run_benchmarks(iterations=200, batch_size=500, workers=2, only=None):
+    schema = synthetic_schema()
+    results = {}
+
+    def selected(name):
+        return only is None or any(part in name for part in only)
+
+    for name, query in workloads().items():
+        count = _iterations(name, iterations)
+        if selected(f"transform_query/{name}"):
+            results[f"transform_query/{name}"] = measure(lambda: transform_query(query, schema), count)
+        if selected(f"cached/{name}"):
+            cache = QueryCache()
+            results[f"cached/{name}"] = measure(lambda: cached_transform_query(query, schema, cache=cache), count)
+
+    # Batches mix every workload except the 1,000-predicate tree, with varying literals
+    shapes = [query for name, query in workloads().items() if name != "where_1000"]
+    batch = [shapes[index % len(shapes)].replace("> 5", f"> {index}") for index in range(batch_size)]
+    for name, batch_workers in (("batch/in_process", 1), (f"batch/workers_{workers}", workers)):
+        if selected(name):
+            result = measure(lambda: transform_many(batch, schema, workers=batch_workers), 3, warmup=1)
+            # Report per-query numbers; latency stays per batch
+            result["throughput"] *= batch_size
+            result["batch_size"] = batch_size
+            results[name] = result
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """
+    Returns one message per benchmark whose median latency is more than `max_regression`
+    percent above the baseline; benchmarks missing from either side are ignored. The median
+    is compared rather than throughput so a few slow outliers do not fail the gate.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        change = (result["p50"] / reference["p50"] - 1) * 100
+        if change > max_regression:
+            regressions.append(
+                f"{name}: p50 {result['p50'] * 1e3:.3f}ms vs baseline {reference['p50'] * 1e3:.3f}ms ({change:+.1f}%)"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the query rewrite pipeline on synthetic workloads.")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per benchmark (default: 200)")
+    parser.add_argument("--batch-size", type=int, default=500, help="queries per batch benchmark")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes for the parallel batch benchmark")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="fail when a median latency is more than this percent above the baseline (default: 10)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args.iterations, args.batch_size, args.workers, args.only)
+
+    for name, result in results.items():
+        print(
+            f"{name:32} {result['throughput']:10.1f}/s  p50 {result['p50'] * 1e3:8.3f}ms  "
+            f"p99 {result['p99'] * 1e3:8.3f}ms  peak {result['peak_memory'] / 1024:8.1f}KiB"
+        )
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "sqlglot": sqlglot.__version__,
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.max_regression)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import argparse
+import gc
+import sys
+from time import perf_counter
+
+from sqlglot import expressions as exp
+
+from bench import synthetic_schema
+from dialects import parse_one
+from evaluator import compile_filter
+from main import extract_operators, transform_query
+from optimizer import normalize
+
+SIZES = (10, 100, 1000, 10000, 100000)
+SHAPES = ("left_deep", "balanced", "alternating")
+# One row per column of the synthetic object, for evaluating compiled filters
+BATCH = {f"c{index}": [index] for index in range(64)}
+
+
+def predicate(index):
+    return f"c{index % 64} = {index}"
+
+
+def left_deep(predicates):
+    # a OR b OR c ...: the parser nests it as ((a OR b) OR c), one level per predicate
+    return " OR ".join(predicate(index) for index in range(predicates))
+
+
+def balanced(predicates):
+    # ((a OR b) AND (c OR d)) OR ...: parenthesized halves, about log2(predicates) levels deep
+    operators = ("OR", "AND")
+    level = [predicate(index) for index in range(predicates)]
+    depth = 0
+    while len(level) > 1:
+        operator = operators[depth % 2]
+        paired = [f"({level[index]} {operator} {level[index + 1]})" for index in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+        depth += 1
+    return level[0]
+
+
+def alternating(predicates):
+    # a AND (b OR (c AND ...)): the connector flips at every level, one level per predicate.
+    # Built as a tree, since parsing such nesting already recurses once per level.
+    def comparison(index):
+        return exp.EQ(this=exp.column(f"c{index % 64}"), expression=exp.Literal.number(index))
+
+    condition = comparison(0)
+    for index in range(1, predicates):
+        connector = exp.And if index % 2 else exp.Or
+        condition = connector(this=comparison(index), expression=exp.Paren(this=condition))
+    return condition
+
+
+def unwrap(condition):
+    # The same tree without its Paren nodes
+    for paren in list(condition.find_all(exp.Paren)):
+        replaced = paren.replace(paren.this)
+        if paren is condition:
+            condition = replaced
+    return condition
+
+
+def time_call(call, budget):
+    # Best of as many runs as fit in `budget` seconds (at least one)
+    gc.collect()
+    best = None
+    spent = 0.0
+    while best is None or spent < budget:
+        started = perf_counter()
+        call()
+        elapsed = perf_counter() - started
+        spent += elapsed
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(sizes=SIZES, shapes=SHAPES, budget=0.5):
+    """
+    Times transform_query and extract_operators on WHERE trees of every shape and size, and
+    normalize and compile_filter (compiling and evaluating one row) on alternating AND/OR
+    nesting; those two stages build the tree in every run, as both rewrite or consume it.
+
+    Returns:
+        list: One dict per (stage, shape, size) with the best time in seconds and the time per
+        predicate, which stays flat when the stage scales linearly.
+    """
+    schema = synthetic_schema()
+    builders = {"left_deep": left_deep, "balanced": balanced}
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            if shape == "alternating":
+                stages = {
+                    "normalize": lambda: normalize(alternating(size)),
+                    "compile_filter": lambda: compile_filter(alternating(size))(BATCH),
+                }
+            else:
+                query = f"SELECT c0 FROM t0 WHERE {builders[shape](size)}"
+                # extract_operators does not look inside parentheses, so it gets the tree without them
+                where = unwrap(parse_one(query).find(exp.Where).this)
+                stages = {
+                    "transform_query": lambda: transform_query(query, schema),
+                    "extract_operators": lambda: extract_operators(where),
+                }
+            for stage, call in stages.items():
+                seconds = time_call(call, budget)
+                results.append({
+                    "stage": stage,
+                    "shape": shape,
+                    "predicates": size,
+                    "seconds": seconds,
+                    "per_predicate": seconds / size,
+                })
+    return results
+
+
+def scaling(results):
+    # {(stage, shape): per-predicate time at the largest size / at the smallest}; ~1 is linear
+    ratios = {}
+    for result in results:
+        key = (result["stage"], result["shape"])
+        first, last = ratios.get(key, (result, result))
+        ratios[key] = (first, result)
+    return {key: last["per_predicate"] / first["per_predicate"] for key, (first, last) in ratios.items()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark deep WHERE trees: left-deep, balanced and alternating, 10-100k predicates.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="predicate counts")
+    parser.add_argument("--shape", choices=SHAPES, action="append", help="tree shape (default: all)")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds of repeated runs per measurement")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(sorted(args.sizes), args.shape or SHAPES, args.budget)
+    for result in results:
+        print(
+            f"{result['stage']:18} {result['shape']:10} {result['predicates']:>7}  "
+            f"{result['seconds'] * 1e3:10.2f}ms  {result['per_predicate'] * 1e6:8.2f}us/predicate"
+        )
+    for (stage, shape), ratio in scaling(results).items():
+        print(f"scaling {stage:18} {shape:10} {ratio:6.2f}x per-predicate cost, largest vs smallest")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Entry points and the most their import may take, in milliseconds. The CLI keeps sqlglot
+# out of its import; everything that rewrites on import pays for sqlglot itself.
+BUDGETS = {
+    "cli": 80,
+    "main": 300,
+    "query_cache": 300,
+    "batch": 300,
+    "server": 350,
+}
+FIRST_REWRITE_BUDGET = 400
+FIRST_REWRITE = """
+from time import perf_counter
+started = perf_counter()
+from main import transform_query
+from schema import schema
+transform_query("SELECT name FROM users WHERE orders.amount > 5", schema)
+print(perf_counter() - started)
+"""
+
+
+def import_times(module):
+    """
+    Imports `module` in a fresh interpreter under -X importtime.
+
+    Returns:
+        dict: {imported module: (self, cumulative) microseconds}, the top-level module included.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def measure_import(module, runs=5):
+    # Best of `runs`: interpreter start-up noise only ever adds time
+    best = None
+    heaviest = []
+    for _ in range(runs):
+        times = import_times(module)
+        total = times[module][1] / 1e6
+        if best is None or total < best:
+            best = total
+            heaviest = sorted(
+                ((name, own / 1e6) for name, (own, _) in times.items() if name != module),
+                key=lambda item: item[1], reverse=True,
+            )[:5]
+    return {"seconds": best, "heaviest": heaviest}
+
+
+def measure_first_rewrite(runs=5):
+    # Import and first transform_query of a fresh interpreter, i.e. one short-lived invocation
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-c", FIRST_REWRITE], capture_output=True, text=True, check=True)
+        elapsed = float(completed.stdout)
+        best = elapsed if best is None else min(best, elapsed)
+    return {"seconds": best}
+
+
+def over_budget(results, budgets):
+    """Messages for the results that took longer than their budget (milliseconds)."""
+    messages = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is not None and result["seconds"] * 1e3 > budget:
+            messages.append(f"{name}: {result['seconds'] * 1e3:.1f}ms, budget {budget}ms")
+    return messages
+
+
+def _budget(text):
+    name, _, milliseconds = text.partition("=")
+    if not milliseconds:
+        raise argparse.ArgumentTypeError(f"expected MODULE=MILLISECONDS, got '{text}'")
+    return name, float(milliseconds)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of the entry points in fresh interpreters.")
+    parser.add_argument("--runs", type=int, default=5, help="interpreters per measurement, the best counts")
+    parser.add_argument("--module", action="append", help="entry point to measure (repeatable; default: all)")
+    parser.add_argument("--budget", action="append", type=_budget, default=[],
+                        help="override a budget, e.g. cli=50 (milliseconds; repeatable)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    budgets = {**BUDGETS, "first_rewrite": FIRST_REWRITE_BUDGET, **dict(args.budget)}
+
+    results = {}
+    for module in args.module or BUDGETS:
+        results[module] = measure_import(module, args.runs)
+    if not args.module:
+        results["first_rewrite"] = measure_first_rewrite(args.runs)
+
+    for name, result in results.items():
+        heaviest = ", ".join(f"{module} {seconds * 1e3:.1f}ms" for module, seconds in result.get("heaviest", ()))
+        print(f"{name:16} {result['seconds'] * 1e3:8.1f}ms  budget {budgets.get(name, '-')}ms  {heaviest}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"budgets": budgets, "results": results}, file, indent=2)
+
+    failures = over_budget(results, budgets)
+    for message in failures:
+        print(f"OVER BUDGET {message}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
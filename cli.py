@@ -0,0 +1,203 @@
+import argparse
+import codecs
+import json
+import mmap
+import sys
+
+from compiled_schema import load_snapshot, save_snapshot
+from schema_registry import load_schema_file
+
+# sqlglot takes most of the start-up time, so it is only imported once there is SQL to
+# split or rewrite: --help and argument errors return without loading it
+
+CHUNK_SIZE = 1 << 16
+# Longest unfinished statement buffered before it is reported as an error
+MAX_STATEMENT_SIZE = 1 << 20
+
+
+def file_chunks(file, size=CHUNK_SIZE):
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def path_chunks(path, size=CHUNK_SIZE):
+    with open(path, encoding="utf-8") as file:
+        yield from file_chunks(file, size)
+
+
+def mmap_chunks(path, size=CHUNK_SIZE):
+    # Decode incrementally so multi-byte characters split across chunks stay intact
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as file:
+        if not file.seek(0, 2):
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, len(mapped), size):
+                yield decoder.decode(mapped[offset:offset + size])
+    yield decoder.decode(b"", final=True)
+
+
+def _split_complete(buffer, tokenizer):
+    """
+    Splits the complete statements off the front of the buffer.
+
+    Returns:
+        tuple: (statements, remainder, failed). `failed` is set when the remainder does not
+        tokenize, e.g. because it ends inside a string, quoted identifier or comment; the
+        statements before that point are still split off.
+    """
+    from sqlglot.errors import TokenError
+    from sqlglot.tokens import TokenType
+
+    try:
+        tokens = tokenizer.tokenize(buffer)
+        failed = False
+    except TokenError:
+        # The tokenizer keeps the tokens it read before the error
+        tokens = tokenizer.tokens
+        failed = True
+
+    statements = []
+    start = 0
+    has_tokens = False
+    for token in tokens:
+        if token.token_type != TokenType.SEMICOLON:
+            has_tokens = True
+            continue
+        if has_tokens:
+            statements.append(buffer[start:token.start].strip())
+        start = token.end + 1
+        has_tokens = False
+    return statements, buffer[start:], failed
+
+
+def iter_statements(chunks, dialect=None, max_size=MAX_STATEMENT_SIZE):
+    """
+    Lazily splits a stream of SQL text into statements on the tokenizer's semicolons.
+
+    Only the current, unfinished statement is held in memory and tokenized again, so
+    semicolons inside strings and comments never split a statement. An unfinished
+    statement longer than `max_size` characters, such as everything after an unterminated
+    quote, is yielded as it is up to its last semicolon so its rewrite reports the error,
+    and splitting goes on after it.
+    """
+    from dialects import tokenizer as dialect_tokenizer
+
+    tokenizer = dialect_tokenizer(dialect)
+    pieces = []
+    size = 0
+    for chunk in chunks:
+        pieces.append(chunk)
+        size += len(chunk)
+        if ";" not in chunk and size <= max_size:
+            continue
+        statements, remainder, _ = _split_complete("".join(pieces), tokenizer)
+        yield from statements
+        if len(remainder) > max_size:
+            cut = remainder.rfind(";")
+            fragment, remainder = (remainder[:cut], remainder[cut + 1:]) if cut >= 0 else (remainder, "")
+            if fragment.strip():
+                yield fragment.strip()
+        pieces = [remainder]
+        size = len(remainder)
+
+    statements, remainder, failed = _split_complete("".join(pieces), tokenizer)
+    yield from statements
+    if failed or (remainder.strip() and tokenizer.tokenize(remainder)):
+        yield remainder.strip()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rewrite logical SQL statements into physical SQL.")
+    parser.add_argument("input", nargs="?", default="-", help="SQL file to read, '-' for stdin (default)")
+    parser.add_argument("--mmap", action="store_true", help="memory-map the input file instead of reading it")
+    parser.add_argument("--json", action="store_true", help="write one JSON object per statement")
+    parser.add_argument("--schema", help="JSON or YAML file with the logical schema (default: schema.py)")
+    parser.add_argument("--schema-snapshot",
+                        help="compiled schema file read instead of compiling the schema; rebuilt when older than the schema")
+    parser.add_argument("--dialect", help="SQL dialect to parse and emit")
+    parser.add_argument("--read", help="SQL dialect to parse (default: --dialect)")
+    parser.add_argument("--write", help="SQL dialect to emit (default: --dialect)")
+    parser.add_argument("--parameterize", choices=("named", "positional"),
+                        help="lift literals into bind placeholders and report their values")
+    parser.add_argument("--optimize", action="store_true",
+                        help="push root-only predicates out of the subquery and skip unused joins")
+    parser.add_argument("--simplify", action="store_true",
+                        help="flatten, deduplicate and fold the WHERE condition before emitting")
+    parser.add_argument("--or-to-in", action="store_true",
+                        help="with --simplify, turn OR chains of equalities on one column into IN lists")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default: 1, in-process)")
+    parser.add_argument("--chunksize", type=int, default=256, help="statements per worker task")
+    parser.add_argument("--disk-cache", help="SQLite file of rewrite templates shared across runs and workers")
+    return parser.parse_args(argv)
+
+
+def load_schema(path, snapshot=None):
+    if path is None:
+        import schema as default_schema
+        source = default_schema.__file__
+    else:
+        source = path
+    if snapshot is not None:
+        compiled = load_snapshot(snapshot, [source])
+        if compiled is not None:
+            return compiled
+    schema = default_schema.schema if path is None else load_schema_file(path)
+    if snapshot is not None:
+        try:
+            save_snapshot(schema, snapshot)
+        except OSError:
+            # A read-only location only costs compiling on every run
+            pass
+    return schema
+
+
+def run(args, stdout=sys.stdout, stderr=sys.stderr):
+    options = {name: getattr(args, name) for name in ("dialect", "read", "write") if getattr(args, name)}
+    if args.parameterize:
+        options["parameterize"] = args.parameterize
+    if args.optimize:
+        options["optimize"] = True
+    if args.simplify:
+        options["simplify"] = True
+        options["or_to_in"] = args.or_to_in
+
+    if args.input == "-":
+        chunks = file_chunks(sys.stdin)
+    elif args.mmap:
+        chunks = mmap_chunks(args.input)
+    else:
+        chunks = path_chunks(args.input)
+
+    failed = 0
+    statements = iter_statements(chunks, args.read or args.dialect)
+    from batch import iter_transform_many
+
+    results = iter_transform_many(
+        statements, load_schema(args.schema, args.schema_snapshot), workers=args.workers, chunksize=args.chunksize,
+        disk_cache=args.disk_cache, **options
+    )
+    for index, result in enumerate(results):
+        if result["error"] is not None:
+            failed += 1
+        if args.json:
+            # default=float: non-integer parameters are Decimals
+            stdout.write(json.dumps({"index": index, **result}, default=float) + "\n")
+        elif result["error"] is None:
+            if "params" in result:
+                stdout.write(f"-- params: {json.dumps(result['params'], default=float)}\n")
+            stdout.write(result["sql"] + ";\n")
+        else:
+            stderr.write(f"statement {index}: {result['error']}\n")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    sys.exit(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
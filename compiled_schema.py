@@ -0,0 +1,377 @@
+import hashlib
+import json
+import marshal
+import os
+import threading
+from collections import OrderedDict
+from sys import intern
+
+from join_planner import JoinPlanner
+
+
+class ColumnRecord:
+    __slots__ = ("table", "name", "physical_name", "qualified", "relation")
+
+    def __init__(self, table, name, physical_name, relation=None):
+        self.table = table
+        self.name = name
+        self.physical_name = physical_name
+        self.qualified = intern(f"{table.physical_name}.{physical_name}") if physical_name else None
+        self.relation = relation
+
+    @property
+    def is_relation(self):
+        return self.relation is not None
+
+    def __repr__(self):
+        return f"ColumnRecord({self.table.name}.{self.name} -> {self.qualified})"
+
+
+class TableRecord:
+    __slots__ = ("name", "physical_name", "is_public", "object_id", "columns", "primary_key")
+
+    def __init__(self, name, physical_name, is_public, object_id=None):
+        self.name = name
+        self.physical_name = physical_name
+        self.is_public = is_public
+        self.object_id = object_id or name
+        self.columns = {}
+        self.primary_key = None
+
+    def __repr__(self):
+        return f"TableRecord({self.name} -> {self.physical_name})"
+
+
+class Relation:
+    """
+    One join edge between two objects.
+
+    `table`/`column` is the relation column that declares the edge, `target`/`target_column`
+    the column it points at. `left` and `right` are the physical column records the join
+    condition compares, from the declaring table's side and the target's side.
+    """
+
+    __slots__ = ("table", "column", "target", "target_column", "virtual", "left", "right")
+
+    def __init__(self, table, column, target, target_column, virtual, left, right):
+        self.table = table
+        self.column = column
+        self.target = target
+        self.target_column = target_column
+        self.virtual = virtual
+        self.left = left
+        self.right = right
+
+    def __repr__(self):
+        return (
+            f"Relation({self.table}.{self.column} -> {self.target}.{self.target_column}: "
+            f"{self.left.qualified} = {self.right.qualified})"
+        )
+
+
+class CompiledSchema:
+    """
+    Read-only index over the logical schema dict.
+
+    Built once; the rewrite functions use it instead of walking the nested dict for
+    every column reference. Given the `previous` version, only the objects whose spec
+    changed, and those with relations to them, are rebuilt; the records of every other
+    object are shared with `previous`, which stays valid and unchanged.
+    """
+
+    __slots__ = ("tables", "physical", "relations", "version", "digests", "planner")
+
+    def __init__(self, schema, previous=None, digests=None):
+        self.tables = {}
+        self.physical = {}
+        self.relations = []
+        self.digests = digests or {name: table_digest(spec) for name, spec in schema.items()}
+        self.version = schema_version(schema, self.digests)
+        rebuild = self._affected(schema, previous)
+
+        pending = []
+        for table_name, spec in schema.items():
+            if table_name not in rebuild:
+                self._reuse(previous, table_name, pending)
+                continue
+            table = TableRecord(
+                intern(table_name), intern(spec["physical_name"]), spec.get("is_public", False), spec.get("object_id")
+            )
+            for column_name, column_spec in spec["columns"].items():
+                column_name = intern(column_name)
+                if isinstance(column_spec, dict):
+                    pending.append((table, column_name, column_spec))
+                    continue
+                column = ColumnRecord(table, column_name, intern(column_spec))
+                table.columns[column_name] = column
+                self.physical[(table.name, column_name)] = column.qualified
+            table.primary_key = table.columns.get("id")
+            self.tables[table.name] = table
+
+        # Relation columns point at other tables, so they are resolved once every table exists.
+        # Foreign keys first: virtual relations take their join columns from the FK they mirror.
+        # Reused relations keep their place, so the planner sees the same edge order either way.
+        pending.sort(key=_is_virtual)
+        for table, column_name, column_spec in pending:
+            if isinstance(column_spec, Relation):
+                self.relations.append(column_spec)
+            else:
+                self._add_relation(table, column_name, column_spec)
+
+        self.planner = JoinPlanner(self)
+
+    def __reduce__(self):
+        # The records reference each other in long chains, which the default pickling walks
+        # recursively; a flat state also makes pickling for worker processes cheaper
+        return _from_state, (self._state(),)
+
+    def _state(self):
+        # Only strings, booleans, tuples and dicts, so marshal can store it
+        tables = tuple(
+            (
+                table.name,
+                table.physical_name,
+                table.is_public,
+                table.object_id,
+                tuple((column.name, column.physical_name) for column in table.columns.values()),
+            )
+            for table in self.tables.values()
+        )
+        relations = tuple(
+            (
+                relation.table,
+                relation.column,
+                relation.target,
+                relation.target_column,
+                relation.virtual,
+                (relation.left.table.name, relation.left.name),
+                (relation.right.table.name, relation.right.name),
+            )
+            for relation in self.relations
+        )
+        return self.version, self.digests, tables, relations
+
+    def _affected(self, schema, previous):
+        # Changed objects, plus the objects whose relation records point into a changed one
+        if previous is None:
+            return set(schema)
+        changed = {name for name in schema if previous.digests.get(name) != self.digests[name]}
+        changed |= set(previous.tables) - set(schema)
+        return changed | {relation.table for relation in previous.relations if relation.target in changed}
+
+    def _reuse(self, previous, table_name, pending):
+        table = previous.tables[table_name]
+        self.tables[table_name] = table
+        for column_name, column in table.columns.items():
+            qualified = previous.physical.get((table_name, column_name))
+            if qualified is not None:
+                self.physical[(table_name, column_name)] = qualified
+            if column.is_relation:
+                pending.append((table, column_name, column.relation))
+
+    def _add_relation(self, table, column_name, column_spec):
+        relation_spec = column_spec["relation"]
+        target = self.table(relation_spec["object"])
+        target_column = intern(relation_spec["column"])
+        virtual = relation_spec.get("virtual", False)
+
+        if virtual:
+            # The FK lives on the target table; this column has no physical counterpart here
+            foreign_key = target.columns[target_column]
+            referenced = foreign_key.relation.target_column
+            column = ColumnRecord(table, column_name, None)
+            left = table.columns[referenced]
+            right = foreign_key
+        else:
+            referenced = target.columns[target_column]
+            physical_name = intern(column_spec.get("physical_name", referenced.physical_name))
+            column = ColumnRecord(table, column_name, physical_name)
+            self.physical[(table.name, column_name)] = column.qualified
+            left = column
+            right = referenced
+
+        column.relation = Relation(table.name, column_name, target.name, target_column, virtual, left, right)
+        table.columns[column_name] = column
+        self.relations.append(column.relation)
+
+    def table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise ValueError(f"Unknown object '{name}'") from None
+
+    def column(self, table_name, column_name):
+        return self.table(table_name).columns.get(column_name)
+
+    def resolve_column(self, parts, default_table=None):
+        """
+        Resolves a column reference, following dotted relation paths.
+
+        Args:
+            parts (list): Qualifiers and column name, e.g. ["orders", "items", "quantity"].
+            default_table (str): Object that unqualified columns and relation paths start from.
+
+        Returns:
+            tuple: (TableRecord, column name, names of the objects the path passes through).
+        """
+        *qualifiers, column_name = parts
+        if not qualifiers:
+            table = self.table(default_table)
+            return table, column_name, (table.name,)
+
+        # The first qualifier is a relation of the default object or an object slug
+        start = self.tables.get(default_table)
+        column = start.columns.get(qualifiers[0]) if start is not None else None
+        if column is not None and column.is_relation:
+            table = self.tables[column.relation.target]
+        else:
+            table = self.table(qualifiers[0])
+
+        path = [table.name]
+        for hop in qualifiers[1:]:
+            column = table.columns.get(hop)
+            if column is None or not column.is_relation:
+                raise ValueError(f"'{table.name}.{hop}' is not a relation")
+            table = self.tables[column.relation.target]
+            path.append(table.name)
+        return table, column_name, tuple(path)
+
+    def qualified(self, table_name, column_name):
+        """
+        Returns the physical "table.column" for a logical column.
+
+        Columns missing from the schema keep their name under the table's physical name.
+        """
+        qualified = self.physical.get((table_name, column_name))
+        if qualified is not None:
+            return qualified
+        column = self.column(table_name, column_name)
+        if column is not None and column.is_relation:
+            raise ValueError(f"'{table_name}.{column_name}' is a relation to '{column.relation.target}', not a column")
+        return f"{self.table(table_name).physical_name}.{column_name}"
+
+
+def _is_virtual(pending):
+    spec = pending[2]
+    return spec.virtual if isinstance(spec, Relation) else spec["relation"].get("virtual", False)
+
+
+def table_digest(spec):
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def schema_version(schema, digests=None):
+    # Stable digest of the schema dict, used to keep cache entries from different schemas apart.
+    # Built from per-object digests so a rebuild only re-hashes the objects that changed.
+    digests = digests or {name: table_digest(spec) for name, spec in schema.items()}
+    payload = "\n".join(f"{name}:{digests[name]}" for name in sorted(digests))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _from_state(state):
+    # Rebuilds the records of a CompiledSchema._state() without re-reading or re-hashing specs
+    version, digests, tables, relations = state
+    compiled = CompiledSchema.__new__(CompiledSchema)
+    compiled.version = version
+    compiled.digests = digests
+    compiled.tables = {}
+    compiled.physical = {}
+    compiled.relations = []
+    for name, physical_name, is_public, object_id, columns in tables:
+        table = TableRecord(name, physical_name, is_public, object_id)
+        for column_name, column_physical_name in columns:
+            column = ColumnRecord(table, column_name, column_physical_name)
+            table.columns[column_name] = column
+            if column.qualified is not None:
+                compiled.physical[(name, column_name)] = column.qualified
+        table.primary_key = table.columns.get("id")
+        compiled.tables[name] = table
+    for table_name, column_name, target, target_column, virtual, left, right in relations:
+        column = compiled.tables[table_name].columns[column_name]
+        column.relation = Relation(
+            table_name,
+            column_name,
+            target,
+            target_column,
+            virtual,
+            compiled.tables[left[0]].columns[left[1]],
+            compiled.tables[right[0]].columns[right[1]],
+        )
+        compiled.relations.append(column.relation)
+    compiled.planner = JoinPlanner(compiled)
+    return compiled
+
+
+# Bumped whenever CompiledSchema._state() changes shape, so older snapshots are rebuilt
+SNAPSHOT_FORMAT = 1
+
+
+def save_snapshot(schema, path):
+    """
+    Writes the compiled form of `schema` to `path`, for load_snapshot to skip compiling.
+
+    The file is written next to `path` and renamed over it, so a concurrent reader sees
+    either the old snapshot or the new one.
+    """
+    data = marshal.dumps((SNAPSHOT_FORMAT, compile_schema(schema)._state()))
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def load_snapshot(path, sources=()):
+    """
+    Reads a CompiledSchema written by save_snapshot.
+
+    Args:
+        path (str): The snapshot file.
+        sources (list): Schema files the snapshot was built from; a snapshot older than any
+            of them is stale.
+
+    Returns:
+        CompiledSchema: Or None when the snapshot is missing, stale, unreadable or from
+        another snapshot format.
+    """
+    try:
+        built = os.stat(path).st_mtime_ns
+        if any(os.stat(source).st_mtime_ns > built for source in sources):
+            return None
+        with open(path, "rb") as file:
+            snapshot_format, state = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if snapshot_format != SNAPSHOT_FORMAT:
+        return None
+    return _from_state(state)
+
+
+# Schema dicts compiled last, by id. Each entry holds its dict, so no id is reused while
+# its entry is cached; dicts cannot be weakly referenced.
+COMPILED_CACHE_SIZE = 16
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_schema(schema):
+    """
+    Returns the CompiledSchema for a schema dict, building it on first use.
+
+    The last COMPILED_CACHE_SIZE dicts are compiled once per object; recompile after
+    mutating one in place. Objects without "is_public" are private.
+    """
+    if isinstance(schema, CompiledSchema):
+        return schema
+    key = id(schema)
+    with _compiled_lock:
+        entry = _compiled.get(key)
+        if entry is not None and entry[0] is schema:
+            _compiled.move_to_end(key)
+            return entry[1]
+    compiled = CompiledSchema(schema)
+    with _compiled_lock:
+        _compiled[key] = (schema, compiled)
+        _compiled.move_to_end(key)
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
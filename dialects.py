@@ -0,0 +1,64 @@
+import re
+import threading
+
+from sqlglot import expressions as exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.errors import ParseError
+
+# Dialect instances are immutable settings and shared by every thread
+_dialects = {}
+_patterns = {}
+# Tokenizers, parsers and generators keep per-call state, so each thread gets its own
+_local = threading.local()
+
+
+def get_dialect(dialect=None):
+    """Returns the shared Dialect instance for a dialect name, class or instance."""
+    if isinstance(dialect, Dialect):
+        return dialect
+    instance = _dialects.get(dialect)
+    if instance is None:
+        instance = _dialects[dialect] = Dialect.get_or_raise(dialect)
+    return instance
+
+
+def _instance(kind, dialect):
+    instances = getattr(_local, "instances", None)
+    if instances is None:
+        instances = _local.instances = {}
+    dialect = get_dialect(dialect)
+    key = (kind, dialect)
+    instance = instances.get(key)
+    if instance is None:
+        instance = instances[key] = getattr(dialect, kind)()
+    return instance
+
+
+def tokenizer(dialect=None):
+    return _instance("tokenizer", dialect)
+
+
+def parse_one(sql, read=None):
+    # sqlglot.parse_one without building a new dialect, tokenizer and parser per call
+    expressions = _instance("parser", read).parse(tokenizer(read).tokenize(sql), sql)
+    if not expressions or expressions[0] is None:
+        raise ParseError(f"No expression was parsed from '{sql}'")
+    return exp.Block(expressions=expressions) if len(expressions) > 1 else expressions[0]
+
+
+def generate(expression, write=None, copy=False):
+    # Generators may rewrite the tree for the target dialect; pass copy=True to keep it intact
+    return _instance("generator", write).generate(expression, copy=copy)
+
+
+def placeholder_pattern(prefix, dialect=None):
+    """
+    Regex matching the named placeholders `<prefix><n>` as the dialect writes them (:name,
+    %(name)s, $name, @name, ...); group 1 is n.
+    """
+    key = (prefix, get_dialect(dialect))
+    pattern = _patterns.get(key)
+    if pattern is None:
+        rendered = generate(exp.Placeholder(this=f"{prefix}INDEX"), dialect)
+        pattern = _patterns[key] = re.compile(re.escape(rendered).replace("INDEX", r"(\d+)"))
+    return pattern
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import marshal
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("sql_parser.cache")
+
+DEFAULT_MAX_BYTES = 64 << 20
+# Evicting frees down to this fraction of max_bytes, so a full cache does not evict on every put
+EVICT_TO = 0.9
+# Seconds between last-used updates of one entry; reads stay reads in between
+TOUCH_INTERVAL = 60.0
+
+
+def key_digest(key, namespace=""):
+    # Cache keys are tuples of strings, numbers and option values with a stable repr
+    return hashlib.sha256(repr((namespace, key)).encode()).hexdigest()
+
+
+class DiskCache:
+    """
+    Rewrite templates in a SQLite file shared by every process on the host.
+
+    Meant as the `backing` tier of a QueryCache: workers that start cold read the
+    templates other workers already compiled. The file is in WAL mode, so readers never
+    block each other or the writer; writers serialize on SQLite's lock, waiting up to
+    `timeout` seconds. Each thread and process opens its own connection.
+
+    Values are stored with marshal, so they must be built from str, bytes, numbers, None,
+    tuples, lists and dicts; reading a row never runs code from the file. Entries are
+    evicted least recently used first once their total size passes `max_bytes`. Disk
+    errors and unreadable rows are logged and counted, never raised: a broken cache file
+    costs a rewrite, not a failed query.
+
+    Args:
+        path (str): Database file, created when missing.
+        max_bytes (int): Total size of the stored templates before eviction starts.
+        timeout (float): Seconds to wait for another process's write lock.
+        namespace (str): Mixed into every key, e.g. a version of the code that built the
+            values, so entries written by other versions are never read.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, timeout=5.0, namespace=""):
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        connection.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        connection.execute("INSERT OR IGNORE INTO totals VALUES ('size', 0)")
+
+    def _connection(self):
+        # Connections cannot cross threads, and a forked worker must not reuse its parent's
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _failed(self, action, error):
+        if not self.errors:
+            logger.warning("Disk cache %s failed for %s: %s", action, self.path, error)
+        self.errors += 1
+
+    def get(self, key):
+        digest = key_digest(key, self.namespace)
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, used FROM entries WHERE key = ?", (digest,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, used = row
+            template = marshal.loads(value)
+        except (sqlite3.Error, ValueError, TypeError, EOFError) as e:
+            self._failed("read", e)
+            return None
+        self.hits += 1
+        now = time.time()
+        if now - used > TOUCH_INTERVAL:
+            # Best effort: a locked database only delays this entry's last-use time
+            try:
+                connection.execute("UPDATE entries SET used = ? WHERE key = ?", (now, digest))
+            except sqlite3.Error as e:
+                self._failed("touch", e)
+        return template
+
+    def _write(self, action, write):
+        # Runs write(connection) in one transaction that holds the write lock from the start
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                write(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._failed(action, e)
+
+    def put(self, key, template):
+        digest = key_digest(key, self.namespace)
+        try:
+            value = marshal.dumps(template)
+        except ValueError as e:
+            self._failed("encode", e)
+            return
+
+        def write(connection):
+            row = connection.execute("SELECT size FROM entries WHERE key = ?", (digest,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (digest, value, len(value), time.time())
+            )
+            growth = len(value) - (row[0] if row is not None else 0)
+            connection.execute("UPDATE totals SET value = value + ? WHERE name = 'size'", (growth,))
+            self._evict(connection)
+
+        self._write("write", write)
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT value FROM totals WHERE name = 'size'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * EVICT_TO)
+        freed = 0
+        evicted = []
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY used"):
+            evicted.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        connection.execute("UPDATE totals SET value = value - ? WHERE name = 'size'", (freed,))
+        self.evictions += len(evicted)
+
+    def clear(self):
+        def write(connection):
+            connection.execute("DELETE FROM entries")
+            connection.execute("UPDATE totals SET value = 0 WHERE name = 'size'")
+
+        self._write("clear", write)
+
+    def size(self):
+        """Total bytes of the stored templates."""
+        return self._connection().execute("SELECT value FROM totals WHERE name = 'size'").fetchone()[0]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "size": len(self),
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+        }
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
@@ -0,0 +1,276 @@
+from decimal import Decimal
+
+from sqlglot import expressions as exp
+
+from optimizer import FLIPPED
+
+# NOT (x op v) is (x inverse v) wherever x is not NULL
+INVERSE = {exp.GT: exp.LTE, exp.GTE: exp.LT, exp.LT: exp.GTE, exp.LTE: exp.GT, exp.EQ: exp.NEQ, exp.NEQ: exp.EQ}
+OPERATORS = {exp.GT: "greater", exp.GTE: "greater_equal", exp.LT: "less", exp.LTE: "less_equal", exp.EQ: "equal", exp.NEQ: "not_equal"}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The vectorized evaluator requires NumPy (pip install numpy)") from None
+    return numpy
+
+
+class _Operand:
+    """A column of the batch or a constant; `column` is the batch key or None."""
+
+    __slots__ = ("column", "value")
+
+    def __init__(self, column=None, value=None):
+        self.column = column
+        self.value = value
+
+
+def _operand(node, params):
+    while isinstance(node, exp.Paren):
+        node = node.this
+    if isinstance(node, exp.Column):
+        return _Operand(column=node.sql())
+    if isinstance(node, exp.Null):
+        return _Operand(value=None)
+    if isinstance(node, exp.Placeholder):
+        if node.name not in params:
+            raise ValueError(f"No value for placeholder '{node.name}'")
+        return _Operand(value=params[node.name])
+    if isinstance(node, (exp.Literal, exp.Neg, exp.Boolean)):
+        value = node.to_py()
+        # Decimal literals would turn every comparison into a per-element Python call
+        return _Operand(value=float(value) if isinstance(value, Decimal) else value)
+    raise ValueError(f"Cannot evaluate '{node.sql()}' in memory: only columns and constants are supported")
+
+
+class _Batch:
+    # Column lookups for one batch: arrays by physical "table.column" key (or the bare
+    # column name when that is all the batch has), and their NULL masks, computed once
+    __slots__ = ("columns", "size", "np", "_nulls")
+
+    def __init__(self, columns, np):
+        self.columns = columns
+        self.np = np
+        self.size = len(next(iter(columns.values()))) if columns else 0
+        self._nulls = {}
+
+    def get(self, key):
+        array = self.columns.get(key)
+        if array is None:
+            array = self.columns.get(key.rsplit(".", 1)[-1])
+            if array is None:
+                raise ValueError(f"Batch has no column '{key}'")
+        return self.np.asarray(array)
+
+    def value(self, operand):
+        return self.get(operand.column) if operand.column is not None else operand.value
+
+    def nulls(self, operand):
+        # None when the operand cannot be NULL, else a boolean mask
+        if operand.column is None:
+            return None
+        if operand.column not in self._nulls:
+            array = self.get(operand.column)
+            if array.dtype.kind == "f":
+                mask = self.np.isnan(array)
+            elif array.dtype.kind == "O":
+                mask = self.np.equal(array, None)
+            else:
+                mask = None
+            self._nulls[operand.column] = mask if mask is not None and mask.any() else None
+        return self._nulls[operand.column]
+
+
+def _known(batch, operands):
+    # Rows where no operand is NULL, or None when that is every row
+    known = None
+    for operand in operands:
+        nulls = batch.nulls(operand)
+        if nulls is not None:
+            known = ~nulls if known is None else known & ~nulls
+    return known
+
+
+def _compare(kind, left, right):
+    if (left.column is None and left.value is None) or (right.column is None and right.value is None):
+        # Comparisons with NULL are never TRUE nor FALSE
+        return _constant(False)
+
+    def evaluate(batch):
+        np = batch.np
+        known = _known(batch, (left, right))
+        compare = getattr(np, OPERATORS[kind])
+        if known is None:
+            return np.broadcast_to(compare(batch.value(left), batch.value(right)), (batch.size,))
+        # Compare only the known rows: object arrays holding None cannot be ordered
+        result = np.zeros(batch.size, bool)
+        left_value, right_value = batch.value(left), batch.value(right)
+        if left.column is not None:
+            left_value = left_value[known]
+        if right.column is not None:
+            right_value = right_value[known]
+        result[known] = compare(left_value, right_value)
+        return result
+
+    return evaluate
+
+
+def _in(operand, values, negated):
+    if None in values:
+        # x IN (1, NULL) is NULL unless x = 1, so it is never FALSE
+        if negated:
+            return _constant(False)
+        values = [value for value in values if value is not None]
+
+    def evaluate(batch):
+        np = batch.np
+        result = np.isin(batch.value(operand), values)
+        if negated:
+            result = ~result
+            known = _known(batch, (operand,))
+            if known is not None:
+                result &= known
+        return result
+
+    return evaluate
+
+
+def _is_null(operand, negated):
+    # The rows where the operand IS NULL, or with `negated` where it IS NOT NULL
+    def evaluate(batch):
+        nulls = batch.nulls(operand)
+        if nulls is None:
+            return batch.np.full(batch.size, negated)
+        return ~nulls if negated else nulls
+
+    return evaluate
+
+
+def _combine(parts, conjunction):
+    result = parts[0].copy()
+    for part in parts[1:]:
+        if conjunction:
+            result &= part
+        else:
+            result |= part
+    return result
+
+
+def _constant(value):
+    def evaluate(batch):
+        return batch.np.full(batch.size, value)
+
+    return evaluate
+
+
+def _compile(node, negated, params):
+    """
+    Compiles `node` into a function of a _Batch returning the rows where it is TRUE, or with
+    `negated` where it is FALSE. Under SQL's three-valued logic the two differ by the rows
+    where it is NULL, which a filter drops either way.
+
+    The AND/OR tree becomes a postfix program of leaf functions and (count, conjunction)
+    steps, so neither compiling nor evaluating it recurses per nesting level.
+    """
+    program = []
+    work = [(node, negated)]
+    while work:
+        item = work.pop()
+        if not isinstance(item[0], exp.Expression):
+            # (count, conjunction) of a connector, once all its operands are compiled
+            program.append(item)
+            continue
+        node, negated = item
+        while isinstance(node, (exp.Paren, exp.Not)):
+            if isinstance(node, exp.Not):
+                negated = not negated
+            node = node.this
+        if not isinstance(node, exp.Connector):
+            program.append(_leaf(node, negated, params))
+            continue
+
+        # TRUE rows of a AND b need both TRUE; FALSE rows of it need either FALSE
+        conjunction = isinstance(node, exp.And) != negated
+        kind = type(node)
+        operands = []
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            while isinstance(current, exp.Paren):
+                current = current.this
+            if type(current) is kind:
+                pending.append(current.expression)
+                pending.append(current.this)
+            else:
+                operands.append(current)
+        work.append((len(operands), conjunction))
+        work.extend((operand, negated) for operand in reversed(operands))
+
+    def evaluate(batch):
+        values = []
+        for step in program:
+            if callable(step):
+                values.append(step(batch))
+                continue
+            count, conjunction = step
+            parts = values[-count:]
+            del values[-count:]
+            values.append(_combine(parts, conjunction))
+        return values[0]
+
+    return evaluate
+
+
+def _leaf(node, negated, params):
+    # A condition other than AND/OR/NOT, see _compile
+    if isinstance(node, exp.Boolean):
+        return _constant(node.this != negated)
+    kind = type(node)
+    if kind in FLIPPED or kind is exp.NEQ:
+        kind = INVERSE[kind] if negated else kind
+        return _compare(kind, _operand(node.this, params), _operand(node.expression, params))
+    if isinstance(node, exp.In) and not node.args.get("query"):
+        values = [_operand(value, params) for value in node.expressions]
+        if any(value.column is not None for value in values):
+            raise ValueError(f"Cannot evaluate '{node.sql()}' in memory: IN lists must be constants")
+        return _in(_operand(node.this, params), [value.value for value in values], negated)
+    if isinstance(node, exp.Is) and isinstance(node.expression, exp.Null):
+        return _is_null(_operand(node.this, params), negated)
+    raise ValueError(f"Cannot evaluate '{node.sql()}' in memory")
+
+
+def compile_filter(condition, params=None):
+    """
+    Compiles a rewritten WHERE condition into a vectorized NumPy filter.
+
+    Supports AND/OR/NOT, the comparisons of `main.OPERATOR_MAP`, IN lists, IS [NOT] NULL and
+    TRUE/FALSE over columns, literals and bound placeholders, with SQL NULL semantics.
+    NULLs are NaN in float arrays and None in object arrays.
+
+    Args:
+        condition (exp.Expression): The condition, e.g. from `transform_where_multiple_tables`;
+            None filters nothing.
+        params (dict): Values of named placeholders in the condition.
+
+    Returns:
+        callable: Takes a batch {"table.column": array} (bare column names also match) and
+        returns the boolean mask of the rows that pass.
+    """
+    if condition is None:
+        evaluate = _constant(True)
+    else:
+        evaluate = _compile(condition, False, params or {})
+
+    def mask(columns):
+        np = _numpy()
+        return evaluate(_Batch(columns, np))
+
+    return mask
+
+
+def filter_batch(columns, mask):
+    """Returns the batch with only the rows where `mask` is set."""
+    np = _numpy()
+    return {name: np.asarray(array)[mask] for name, array in columns.items()}
@@ -0,0 +1,141 @@
+import re
+
+from sqlglot.errors import TokenError
+from sqlglot.tokens import TokenType
+
+from dialects import tokenizer
+
+# How the default dialect writes each comparison back (NEQ is always <>)
+COMPARISONS = {
+    TokenType.EQ: "=",
+    TokenType.NEQ: "<>",
+    TokenType.GT: ">",
+    TokenType.GTE: ">=",
+    TokenType.LT: "<",
+    TokenType.LTE: "<=",
+}
+CONNECTORS = {TokenType.AND: "AND", TokenType.OR: "OR"}
+# Numbers the generator writes back exactly as they were read
+PLAIN_NUMBER = re.compile(r"\d+(\.\d+)?")
+# Physical "table.column" names the generator writes without quotes
+PLAIN_QUALIFIED = re.compile(r"[_a-zA-Z]\w*\.[_a-zA-Z]\w*")
+STRATEGIES = ("in", "exists", "flat", "auto")
+
+
+def _physical(root, token):
+    # "table.column" for a plain column of the root object, else None
+    if token.token_type != TokenType.VAR:
+        return None
+    column = root.columns.get(token.text)
+    if column is None or column.is_relation or not PLAIN_QUALIFIED.fullmatch(column.qualified):
+        return None
+    return column.qualified
+
+
+def _constant(tokens, index):
+    # (SQL of the constant starting at tokens[index], index after it), or None
+    token = tokens[index] if index < len(tokens) else None
+    if token is None:
+        return None
+    kind = token.token_type
+    if kind == TokenType.STRING:
+        return "'" + token.text.replace("'", "''") + "'", index + 1
+    if kind == TokenType.NUMBER and PLAIN_NUMBER.fullmatch(token.text):
+        return token.text, index + 1
+    if kind == TokenType.PLACEHOLDER and token.text == "?":
+        return "?", index + 1
+    following = tokens[index + 1] if index + 1 < len(tokens) else None
+    if following is None:
+        return None
+    if kind == TokenType.DASH and following.token_type == TokenType.NUMBER and PLAIN_NUMBER.fullmatch(following.text):
+        return f"-{following.text}", index + 2
+    if kind == TokenType.COLON and following.token_type == TokenType.VAR:
+        return f":{following.text}", index + 2
+    return None
+
+
+def _condition(root, tokens, index):
+    # "column op constant [AND|OR ...]" up to the end of the tokens, or None
+    parts = []
+    while True:
+        column = _physical(root, tokens[index]) if index < len(tokens) else None
+        operator = COMPARISONS.get(tokens[index + 1].token_type) if index + 1 < len(tokens) else None
+        if column is None or operator is None:
+            return None
+        constant = _constant(tokens, index + 2)
+        if constant is None:
+            return None
+        value, index = constant
+        parts.append(f"{column} {operator} {value}")
+        if index == len(tokens):
+            return " ".join(parts)
+        connector = CONNECTORS.get(tokens[index].token_type)
+        if connector is None:
+            return None
+        parts.append(connector)
+        index += 1
+
+
+def fast_transform(input_query, schema, strategy="in"):
+    """
+    Rewrites `SELECT col, ... FROM object [WHERE col op constant [AND|OR ...]]` from the
+    token stream alone, without parsing it.
+
+    Columns must be plain, unqualified columns of the object and constants string or
+    number literals, negated numbers or placeholders. For anything else this returns None
+    and the query takes the full path. The output is the SQL transform_query gives in the
+    default dialect without permissions, parameterization, `optimize` or `simplify`.
+
+    Args:
+        schema (CompiledSchema): The compiled schema.
+        strategy (str): "in", "exists", "flat" or "auto"; other strategies are not handled.
+
+    Returns:
+        str: The rewritten query, or None.
+    """
+    # Parentheses mean subqueries, function calls or IN lists: not worth tokenizing for
+    if strategy not in STRATEGIES or "(" in input_query:
+        return None
+    try:
+        tokens = tokenizer().tokenize(input_query)
+    except TokenError:
+        return None
+    if len(tokens) < 4 or tokens[0].token_type != TokenType.SELECT or any(token.comments for token in tokens):
+        return None
+
+    # SELECT a, b, ... FROM object
+    index = 1
+    select = []
+    while index < len(tokens) and tokens[index].token_type != TokenType.FROM:
+        if select:
+            if tokens[index].token_type != TokenType.COMMA:
+                return None
+            index += 1
+        if index == len(tokens):
+            return None
+        select.append(tokens[index])
+        index += 1
+    if not select or index + 1 >= len(tokens) or tokens[index + 1].token_type != TokenType.VAR:
+        return None
+    root = schema.tables.get(tokens[index + 1].text)
+    key = root.primary_key if root is not None else None
+    if key is None or key.is_relation or not PLAIN_QUALIFIED.fullmatch(key.qualified):
+        return None
+    columns = [_physical(root, token) for token in select]
+    if None in columns:
+        return None
+    query = f"SELECT {', '.join(columns)} FROM {root.physical_name}"
+
+    index += 2
+    if index == len(tokens):
+        return query
+    if tokens[index].token_type != TokenType.WHERE:
+        return None
+    condition = _condition(root, tokens, index + 1)
+    if condition is None:
+        return None
+    if strategy == "in":
+        key = key.qualified
+        return f"{query} WHERE {key} IN (SELECT DISTINCT {key} AS id FROM {root.physical_name} WHERE {condition})"
+    # Root-only conditions join nothing, so EXISTS and "auto" both filter the rows directly
+    return f"{query} WHERE {condition}"
@@ -0,0 +1,328 @@
+import argparse
+import json
+import random
+import sqlite3
+import sys
+from collections import Counter
+from decimal import Decimal
+from time import perf_counter
+
+from sqlglot import expressions as exp
+from sqlglot.dialects.sqlite import SQLite
+
+from compiled_schema import compile_schema
+from dialects import generate, parse_one
+from main import transform_query
+from permissions import STRATEGIES as PERMISSION_STRATEGIES
+from permissions import PermissionContext
+
+STRATEGIES = ("in", "exists", "semi_join", "flat")
+# Synthetic values: columns named *status take one of STATUSES, *name columns "name_<id>" and
+# every other column an integer below INTEGER_RANGE
+STATUSES = ("active", "inactive", "pending", "closed")
+INTEGER_RANGE = 1000
+# Ownership rows of private objects: each record has one owner below OWNER_RANGE in
+# HARNESS_ORG, and a quarter of them have expired
+HARNESS_ORG = "org"
+OWNER_RANGE = 4
+
+QUERIES = (
+    "SELECT name FROM users WHERE spending > 500",
+    "SELECT name, status FROM users WHERE status = 'active' AND budget < 100",
+    "SELECT name FROM users WHERE orders.amount > 900",
+    "SELECT * FROM users WHERE orders.amount > 900",
+    "SELECT name FROM users WHERE orders.amount > 900 AND spending < 100",
+    "SELECT name FROM users WHERE orders.items.quantity > 990 OR status = 'closed'",
+    "SELECT amount FROM orders WHERE user_id.spending > 900",
+    "SELECT name FROM categories WHERE items.quantity > 995",
+    "SELECT status, COUNT(*) FROM users WHERE orders.status = 'pending' GROUP BY status",
+    "SELECT name FROM users WHERE spending > 100 ORDER BY spending DESC LIMIT 10",
+)
+
+
+class HarnessSQLite(SQLite):
+    """SQLite, with the current epoch of permission checks written the way SQLite has it."""
+
+    class Generator(SQLite.Generator):
+        def extract_sql(self, expression):
+            # EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) is a syntax error in SQLite
+            if expression.name.upper() == "EPOCH" and isinstance(expression.expression, exp.CurrentTimestamp):
+                return "CAST(STRFTIME('%s', 'now') AS INTEGER)"
+            return super().extract_sql(expression)
+
+
+WRITE = HarnessSQLite()
+
+
+def _column_kind(table, column):
+    if column is table.primary_key:
+        return ("key",)
+    if column.is_relation:
+        return ("foreign_key", column.relation.target)
+    if column.name.endswith("status"):
+        return ("status",)
+    if column.name.endswith("name"):
+        return ("name",)
+    return ("integer",)
+
+
+def physical_columns(table):
+    """{physical column: kind} of one object; virtual relations have no column of their own."""
+    columns = {}
+    for column in table.columns.values():
+        if column.physical_name is not None:
+            columns.setdefault(column.physical_name, _column_kind(table, column))
+    return columns
+
+
+def create_database(schema, path=":memory:"):
+    """
+    Creates the physical tables of `schema` in a SQLite database, plus one view per object
+    under its logical name with logical column names, so logical queries without relation
+    paths run as written. Also creates an empty record_ownership table.
+
+    Returns:
+        sqlite3.Connection
+    """
+    schema = compile_schema(schema)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    for table in schema.tables.values():
+        definitions = []
+        for name, kind in physical_columns(table).items():
+            if kind[0] == "key":
+                definitions.append(f"{name} INTEGER PRIMARY KEY")
+            elif kind[0] in ("status", "name"):
+                definitions.append(f"{name} TEXT")
+            else:
+                definitions.append(f"{name} INTEGER")
+        connection.execute(f"DROP VIEW IF EXISTS {table.name}")
+        connection.execute(f"DROP TABLE IF EXISTS {table.physical_name}")
+        connection.execute(f"CREATE TABLE {table.physical_name} ({', '.join(definitions)})")
+        logical = ", ".join(
+            f"{column.physical_name} AS {column.name}"
+            for column in table.columns.values()
+            if column.physical_name is not None
+        )
+        connection.execute(f"CREATE VIEW {table.name} AS SELECT {logical} FROM {table.physical_name}")
+    connection.execute("DROP TABLE IF EXISTS record_ownership")
+    connection.execute(
+        "CREATE TABLE record_ownership "
+        "(record_id INTEGER, org_id TEXT, object_id TEXT, owner INTEGER, expires_at INTEGER)"
+    )
+    return connection
+
+
+def _value(kind, row_id, sizes, generator):
+    if kind[0] == "key":
+        return row_id
+    if kind[0] == "foreign_key":
+        return generator.randint(1, sizes[kind[1]])
+    if kind[0] == "status":
+        return generator.choice(STATUSES)
+    if kind[0] == "name":
+        return f"name_{row_id}"
+    return generator.randrange(INTEGER_RANGE)
+
+
+def populate(connection, schema, rows=10000, sizes=None, seed=0, batch_size=50000):
+    """
+    Fills every physical table with synthetic rows: keys 1..n, foreign keys uniform over
+    the referenced table's keys, text for status/name columns and integers in
+    [0, INTEGER_RANGE) for the rest. Foreign key columns get an index afterwards. Records
+    of private objects get record_ownership rows, see OWNER_RANGE.
+
+    Args:
+        rows (int): Rows per object.
+        sizes (dict): Row counts of particular objects, overriding `rows`.
+        seed (int): Seed of the generator, so a size always gives the same data.
+
+    Returns:
+        dict: {object: row count}
+    """
+    schema = compile_schema(schema)
+    sizes = {name: (sizes or {}).get(name, rows) for name in schema.tables}
+    generator = random.Random(seed)
+    for table in schema.tables.values():
+        columns = physical_columns(table)
+        kinds = list(columns.values())
+        insert = (
+            f"INSERT INTO {table.physical_name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+        for start in range(1, sizes[table.name] + 1, batch_size):
+            stop = min(start + batch_size, sizes[table.name] + 1)
+            connection.executemany(
+                insert,
+                ([_value(kind, row_id, sizes, generator) for kind in kinds] for row_id in range(start, stop)),
+            )
+        for name, kind in columns.items():
+            if kind[0] == "foreign_key":
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {table.physical_name}_{name} ON {table.physical_name} ({name})")
+        if not table.is_public:
+            # A generator of its own, so the objects' data is the same with or without it
+            owners = random.Random(f"ownership:{seed}")
+            _populate_ownership(connection, table, sizes[table.name], owners, batch_size)
+    connection.execute("CREATE INDEX IF NOT EXISTS record_ownership_record ON record_ownership (record_id)")
+    connection.commit()
+    connection.execute("ANALYZE")
+    return sizes
+
+
+def _populate_ownership(connection, table, rows, generator, batch_size):
+    # One record_ownership row per record of a private object, see OWNER_RANGE
+    insert = "INSERT INTO record_ownership (record_id, org_id, object_id, owner, expires_at) VALUES (?, ?, ?, ?, ?)"
+    for start in range(1, rows + 1, batch_size):
+        stop = min(start + batch_size, rows + 1)
+        connection.executemany(
+            insert,
+            (
+                (row_id, HARNESS_ORG, table.object_id, generator.randrange(OWNER_RANGE), generator.choice((None, 0, 1 << 40, 1 << 40)))
+                for row_id in range(start, stop)
+            ),
+        )
+
+
+def _bindable(params):
+    if isinstance(params, dict):
+        return {name: float(value) if isinstance(value, Decimal) else value for name, value in params.items()}
+    return [float(value) if isinstance(value, Decimal) else value for value in params]
+
+
+def execute(connection, sql, params=None, repeat=3):
+    """
+    Runs `sql` `repeat` times.
+
+    Returns:
+        tuple: (rows of the last run, best time in seconds)
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        started = perf_counter()
+        rows = connection.execute(sql, params or ()).fetchall()
+        elapsed = perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, best
+
+
+def explain(connection, sql, params=None):
+    # The detail column of every EXPLAIN QUERY PLAN row, e.g. "SEARCH order_details USING INDEX ..."
+    return [row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())]
+
+
+def same_rows(left, right, ordered_by_limit=False):
+    # Result sets compare as multisets; under a LIMIT only the count is fixed (ties may differ)
+    if ordered_by_limit:
+        return len(left) == len(right)
+    return Counter(left) == Counter(right)
+
+
+def compare(connection, schema, query, strategies=STRATEGIES, repeat=3, dialect=None, **options):
+    """
+    Runs a logical query and its rewrite under every strategy and checks that they agree.
+
+    The logical query runs against the logical views when it can (no relation paths) and
+    without `permissions` in `options`, which it cannot check; the others are checked
+    against the first strategy that succeeded.
+
+    Returns:
+        dict: "query", "reference" ("logical" or a strategy) and "results", one dict per
+        strategy (and "logical") with "sql", "rows", "seconds", "plan", "matches" and "error".
+    """
+    results = {}
+    logical = generate(parse_one(query, dialect), WRITE)
+    if options.get("permissions") is not None:
+        results["logical"] = {"sql": logical, "error": "not run: the logical views have no ownership checks"}
+    else:
+        try:
+            rows, seconds = execute(connection, logical, repeat=repeat)
+            results["logical"] = {"sql": logical, "rows": rows, "seconds": seconds, "plan": explain(connection, logical)}
+        except sqlite3.Error as e:
+            results["logical"] = {"sql": logical, "error": str(e)}
+
+    for strategy in strategies:
+        try:
+            sql = transform_query(query, schema, strategy=strategy, read=dialect, write=WRITE, **options)
+            params = None
+            if isinstance(sql, tuple):
+                # sqlite3 cannot bind Decimal, which parameterized decimal literals come as
+                sql, params = sql
+                params = _bindable(params)
+            rows, seconds = execute(connection, sql, params, repeat)
+            results[strategy] = {"sql": sql, "rows": rows, "seconds": seconds, "plan": explain(connection, sql, params)}
+        except (ValueError, sqlite3.Error) as e:
+            results[strategy] = {"error": f"{type(e).__name__}: {e}"}
+
+    reference = "logical" if "rows" in results["logical"] else next(
+        (strategy for strategy in strategies if "rows" in results[strategy]), None
+    )
+    limited = parse_one(query, dialect).args.get("limit") is not None
+    for name, result in results.items():
+        result.setdefault("error", None)
+        if "rows" in result and reference is not None:
+            result["matches"] = same_rows(result["rows"], results[reference]["rows"], limited)
+    return {"query": query, "reference": reference, "results": results}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run rewritten queries on synthetic SQLite data and rank the strategies.")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per object (default: 10000)")
+    parser.add_argument("--database", default=":memory:", help="SQLite file to build (default: in memory)")
+    parser.add_argument("--reuse", action="store_true", help="use the data already in --database")
+    parser.add_argument("--query", action="append", help="logical query to run (repeatable; default: built-in set)")
+    parser.add_argument("--strategy", action="append", choices=STRATEGIES, help="strategies to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query, the best time counts")
+    parser.add_argument("--optimize", action="store_true", help="rewrite with optimize=True")
+    parser.add_argument("--permissions", choices=PERMISSION_STRATEGIES,
+                        help="check ownership of private objects with this permission strategy")
+    parser.add_argument("--owner", type=int, action="append",
+                        help=f"owner whose records are visible with --permissions (repeatable; default: 0, of 0..{OWNER_RANGE - 1})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from schema import schema
+
+    args = parse_args(argv)
+    if args.reuse:
+        connection = sqlite3.connect(args.database)
+    else:
+        connection = create_database(schema, args.database)
+        started = perf_counter()
+        sizes = populate(connection, schema, args.rows, seed=args.seed)
+        print(f"Loaded {sum(sizes.values())} rows in {perf_counter() - started:.1f}s", file=sys.stderr)
+
+    options = {"optimize": True} if args.optimize else {}
+    if args.permissions:
+        options["permissions"] = PermissionContext(HARNESS_ORG, args.owner or [0], strategy=args.permissions)
+    reports = []
+    failed = False
+    for query in args.query or QUERIES:
+        report = compare(connection, schema, query, args.strategy or STRATEGIES, args.repeat, **options)
+        reports.append(report)
+        print(f"\n{query}  (reference: {report['reference']})")
+        ranked = sorted(report["results"].items(), key=lambda item: item[1].get("seconds", float("inf")))
+        for name, result in ranked:
+            if result["error"] is not None:
+                print(f"  {name:10} {'error':>12}  {result['error']}")
+                continue
+            matches = result.get("matches")
+            failed = failed or matches is False
+            status = "ok" if matches else "MISMATCH" if matches is False else "-"
+            print(f"  {name:10} {result['seconds'] * 1e3:10.2f}ms  {len(result['rows']):8} rows  {status}")
+
+    if args.output:
+        for report in reports:
+            for result in report["results"].values():
+                if "rows" in result:
+                    result["rows"] = len(result["rows"])
+        with open(args.output, "w") as file:
+            json.dump(reports, file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
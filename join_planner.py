@@ -0,0 +1,88 @@
+from collections import deque
+
+
+class JoinStep:
+    """
+    One JOIN in a plan: `table` joined ON new_column = existing_column.
+
+    `fan_out` is set when the joined table holds the foreign key, i.e. one row of the
+    existing side can match many rows of the new one.
+    """
+
+    __slots__ = ("table", "relation", "on", "fan_out")
+
+    def __init__(self, table, relation, on, fan_out):
+        self.table = table
+        self.relation = relation
+        self.on = on
+        self.fan_out = fan_out
+
+    def __repr__(self):
+        new, existing = self.on
+        return f"JoinStep({self.table.physical_name} ON {new.qualified} = {existing.qualified})"
+
+
+class JoinPlanner:
+    """
+    Plans the JOIN chain between a root object and any set of referenced objects.
+
+    Every foreign key in the schema is one undirected edge of the graph (virtual relations
+    only mirror an FK, so they add no edge). Each referenced object is reached by its
+    shortest path from the root, and plans are memoized per (root, targets).
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.graph = {name: [] for name in schema.tables}
+        for relation in schema.relations:
+            if relation.virtual:
+                continue
+            self.graph[relation.table].append((relation.target, relation))
+            self.graph[relation.target].append((relation.table, relation))
+        self._plans = {}
+
+    def plan(self, root, targets):
+        targets = frozenset(targets) - {root}
+        key = (root, targets)
+        steps = self._plans.get(key)
+        if steps is None:
+            steps = self._plans[key] = self._plan(root, targets)
+        return steps
+
+    def _plan(self, root, targets):
+        if not targets:
+            return ()
+
+        # Breadth-first search from the root gives the shortest path to every reachable object
+        parents = {root: None}
+        depth = {root: 0}
+        queue = deque([root])
+        while queue:
+            table = queue.popleft()
+            for neighbour, relation in self.graph[table]:
+                if neighbour not in parents:
+                    parents[neighbour] = (table, relation)
+                    depth[neighbour] = depth[table] + 1
+                    queue.append(neighbour)
+
+        steps = []
+        joined = {root}
+        for target in sorted(targets, key=lambda name: (depth.get(name, 0), name)):
+            if target not in parents:
+                raise ValueError(f"No relation path from '{root}' to '{target}'")
+            path = []
+            table = target
+            while table not in joined:
+                previous, relation = parents[table]
+                path.append((table, relation))
+                table = previous
+            for table, relation in reversed(path):
+                steps.append(self._step(table, relation))
+                joined.add(table)
+        return tuple(steps)
+
+    def _step(self, table_name, relation):
+        # Relations are declared on the FK side: `left` is the FK column, `right` the key it references
+        if table_name == relation.table:
+            return JoinStep(self.schema.tables[table_name], relation, (relation.left, relation.right), True)
+        return JoinStep(self.schema.tables[table_name], relation, (relation.right, relation.left), False)
@@ -1,251 +1,295 @@
-import sqlglot
 from sqlglot import expressions as exp
 
+import tracing
+from compiled_schema import compile_schema
+from dialects import generate, parse_one
+from fast_path import fast_transform
+from optimizer import normalize, push_down
+from parameters import lift_literals, render
+from strategies import QueryPlan, emit
+from rewriter import column_parts, rewrite
+from schema import schema
+
+OPERATOR_MAP = {
+    exp.GT: '>', exp.LT: '<',
+    exp.GTE: '>=', exp.LTE: '<=',
+    exp.EQ: '=', exp.NEQ: '!='
+}
+
 def extract_operators(expression):
+    # 'left' and 'right' hold the operand nodes; str() them only where the SQL text is needed.
+    # Walks with an explicit stack so machine-generated chains of thousands of ORs do not hit
+    # the recursion limit; the order is the same pre-order a recursive walk gives.
     operators = []
+    pending = [expression]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (exp.Or, exp.And)):
+            operators.append({
+                'operator': 'OR' if isinstance(node, exp.Or) else 'AND',
+                'left': node.left,
+                'right': node.right
+            })
+            pending.append(node.right)
+            pending.append(node.left)
+        elif isinstance(node, tuple(OPERATOR_MAP)):
+            operators.append({
+                'operator': OPERATOR_MAP[type(node)],
+                'left': node.left,
+                'right': node.right
+            })
+    return operators
 
-    def traverse(node):
-        if isinstance(node, exp.Or):
-            conditions = {
-                'operator': 'OR',
-                'left': str(node.left),
-                'right': str(node.right)
-            }
-            operators.append(conditions)
-            traverse(node.left)
-            traverse(node.right)
-        elif isinstance(node, exp.And):
-            conditions = {
-                'operator': 'AND',
-                'left': str(node.left),
-                'right': str(node.right)
-            }
-            operators.append(conditions)
-            traverse(node.left)
-            traverse(node.right)
-        elif isinstance(node, (exp.GT, exp.LT, exp.GTE, exp.LTE, exp.EQ, exp.NEQ)):
-            operator_map = {
-                exp.GT: '>', exp.LT: '<',
-                exp.GTE: '>=', exp.LTE: '<=',
-                exp.EQ: '=', exp.NEQ: '!='
-            }
-            conditions = {
-                'operator': operator_map[type(node)],
-                'left': str(node.left),
-                'right': str(node.right)
-            }
-            operators.append(conditions)
+def transform_where_condition(condition, schema, table=None, referenced=None, aliases=None):
+    # Rewrites the condition's column references in place; unqualified columns belong to `table`
+    return rewrite(condition, schema, table, referenced, aliases)
 
-    traverse(expression)
-    return operators
+def transform_where_multiple_tables(where_expr, schema, table=None, referenced=None, aliases=None):
+    if not where_expr:
+        return None
 
-def transform_where_condition(condition, schema):
-    if isinstance(condition, (exp.GT, exp.LT, exp.GTE, exp.LTE, exp.EQ, exp.NEQ)):
-        left = condition.left
-        right = condition.right
+    # One pass over the whole tree: And/Or nodes are kept, only their leaves are rewritten
+    return transform_where_condition(where_expr, schema, table, referenced, aliases)
 
-        # Define operator mapping
-        operator_map = {
-            exp.GT: '>',
-            exp.LT: '<',
-            exp.GTE: '>=',
-            exp.LTE: '<=',
-            exp.EQ: '=',
-            exp.NEQ: '!='
-        }
+def transform_select(select_expressions, table, schema, referenced=None, aliases=None):
+    # Every projection is kept: columns, *, aggregates, expressions and their aliases
+    return [rewrite(expr, schema, table, referenced, aliases) for expr in select_expressions]
 
-        # Get the correct operator
-        operator = operator_map[type(condition)]
+def table_aliases(parsed_query, schema):
+    # {alias: object name} for the aliased objects of FROM and JOIN
+    return {
+        node.alias: node.name
+        for node in parsed_query.find_all(exp.Table)
+        if node.alias and node.name in schema.tables
+    }
 
-        # Transform left side
-        if isinstance(left, exp.Column):
-            table_name = left.table
-            column_name = left.name
-            if table_name and column_name in schema[table_name]["columns"]:
-                left_transformed = f"{schema[table_name]['physical_name']}.{schema[table_name]['columns'][column_name]}"
-            else:
-                left_transformed = str(left)
-        else:
-            left_transformed = str(left)
+def transform_joins(parsed_query, schema, table, referenced=None, aliases=None):
+    """
+    Rewrites the query's explicit JOINs for QueryPlan.explicit_joins.
 
-        # Transform right side
-        if isinstance(right, exp.Column):
-            table_name = right.table
-            column_name = right.name
-            if table_name and column_name in schema[table_name]["columns"]:
-                right_transformed = f"{schema[table_name]['physical_name']}.{schema[table_name]['columns'][column_name]}"
-            else:
-                right_transformed = str(right)
-        else:
-            right_transformed = str(right)
+    The physical query names every object by its physical name, so an object can only be
+    joined once and never to itself.
+    """
+    joins = []
+    joined = {table}
+    for join in parsed_query.args.get("joins") or ():
+        target = join.this
+        if not isinstance(target, exp.Table) or target.name not in schema.tables:
+            raise ValueError(f"Unsupported JOIN target '{target.sql()}', expected a schema object")
+        if target.name in joined:
+            raise ValueError(f"Object '{target.name}' is joined more than once")
+        if join.args.get("using"):
+            raise ValueError(f"JOIN '{target.name}' USING (...) is not supported, use ON")
+        joined.add(target.name)
+        referenced[target.name] = True
+        on = join.args.get("on")
+        joins.append({
+            "table": schema.table(target.name),
+            "join_type": " ".join(part for part in (join.side, join.kind) if part),
+            "on": rewrite(on, schema, table, referenced, aliases) if on is not None else None,
+        })
+    return joins
 
-        return f"{left_transformed} {operator} {right_transformed}"
+def transform_clauses(parsed_query, schema, table, referenced=None, aliases=None):
+    # The outer query's clauses, see QueryPlan.clauses. ORDER BY may name SELECT aliases;
+    # GROUP BY and HAVING only where no column of the root has the same name.
+    projected = {expr.alias for expr in parsed_query.expressions if isinstance(expr, exp.Alias)}
+    shadowed = {name for name in projected if name not in schema.table(table).columns}
+    clauses = {}
 
-    return str(condition)
+    group = parsed_query.args.get("group")
+    clauses["group"] = [rewrite(expr, schema, table, referenced, aliases, shadowed) for expr in group.expressions] if group else []
+    having = parsed_query.args.get("having")
+    clauses["having"] = rewrite(having.this, schema, table, referenced, aliases, shadowed) if having else None
 
-def transform_where_multiple_tables(where_expr, schema):
-    if not where_expr:
-        return ""
+    order = parsed_query.args.get("order")
+    order_tables = {}
+    clauses["order"] = [rewrite(expr, schema, table, order_tables, aliases, projected) for expr in order.expressions] if order else []
+    referenced.update(order_tables)
+    # Keys the matching-keys subquery can compute too: root columns, no ordinals or SELECT aliases
+    clauses["order_on_root"] = set(order_tables) <= {table} and all(
+        not isinstance(ordered.this, (exp.Literal, exp.Placeholder))
+        and all(column.table for column in ordered.find_all(exp.Column))
+        for ordered in clauses["order"]
+    )
 
-    def transform_expression(expr):
-        if isinstance(expr, exp.Or):
-            left = transform_expression(expr.left)
-            right = transform_expression(expr.right)
-            return f"({left} OR {right})"
-        elif isinstance(expr, exp.And):
-            left = transform_expression(expr.left)
-            right = transform_expression(expr.right)
-            return f"({left} AND {right})"
-        else:
-            return transform_where_condition(expr, schema)
+    limit = parsed_query.args.get("limit")
+    clauses["limit"] = limit.expression if limit else None
+    offset = parsed_query.args.get("offset")
+    clauses["offset"] = offset.expression if offset else None
+    distinct = parsed_query.args.get("distinct")
+    clauses["distinct"] = rewrite(distinct, schema, table, referenced, aliases) if distinct else None
+    clauses["aggregated"] = any(
+        expr.find(exp.AggFunc, exp.Window) for expr in parsed_query.expressions + clauses["order"]
+    )
+    return clauses
 
-    return transform_expression(where_expr)
+def get_tables_from_query(parsed_query, schema, aliases=None):
+    # One walk over the tree: objects come from FROM/JOIN tables and from column qualifiers,
+    # including dotted relation paths such as orders.items.quantity. Literals are never
+    # looked at, so 'orders' inside a string does not mark orders as present.
+    from_clause = parsed_query.find(exp.From)
+    root = from_clause.this.name if from_clause else None
+    aliases = aliases or {}
+    tables = {}
+    if root in schema.tables:
+        tables[root] = True
 
-def transform_select(select_expressions, table, schema):
-    transformed_select = []
-    for expr in select_expressions:
-        if isinstance(expr, exp.Column):
-            table_name = expr.table or table
-            column_name = expr.name
-            if column_name in schema[table_name]["columns"]:
-                transformed_select.append(
-                    f"{schema[table_name]['physical_name']}.{schema[table_name]['columns'][column_name]}"
-                )
-            else:
-                transformed_select.append(f"{schema[table_name]['physical_name']}.{column_name}")
-    return ", ".join(transformed_select)
+    for node in parsed_query.find_all(exp.Column, exp.Table):
+        if isinstance(node, exp.Table):
+            if node.name in schema.tables:
+                tables[node.name] = True
+            continue
+        parts = column_parts(node)
+        if len(parts) > 1:
+            parts[0] = aliases.get(parts[0], parts[0])
+            _, _, path = schema.resolve_column(parts, root)
+            tables.update(dict.fromkeys(path, True))
+    return list(tables)
 
-def get_tables_from_query(input_query,parsed_query):
-    slugs = ["users", "orders", "items", "categories"]
-    tokens=input_query.split()
-    print("Tokens----------->",tokens)
-    tables = []
-    for slug in slugs:
-        for token in tokens:
-            if slug in token:
-                if slug in tables:
-                    break
-                print(f"{slug} is present in query")
-                tables.append(slug)
+def _without(steps, tables):
+    # Planned JOIN steps minus the objects the query joins explicitly
+    return tuple(step for step in steps if step.table.name not in tables)
 
+def generate_query(query, write, parameterize=None, values=None, copy=False):
+    if parameterize is not None:
+        return render(query, values, parameterize, write, copy=copy)
+    return generate(query, write, copy=copy)
 
-    for table in parsed_query.find_all(exp.Table):
-        if table.name not in tables:
-            tables.append(table.name)
-    return tables
+def transform_query(
+    input_query,
+    schema,
+    hierarchy=None,
+    dialect=None,
+    permissions=None,
+    strategy="in",
+    parameterize=None,
+    params=None,
+    read=None,
+    write=None,
+    optimize=False,
+    simplify=False,
+    or_to_in=False,
+    fast_path=True,
+):
+    # `hierarchy` is no longer consulted: joins are planned over the schema's relations.
+    # `read` and `write` default to `dialect`. A list of `write` dialects returns
+    # {dialect: sql}, rewriting the query once and generating it per dialect.
+    # `permissions` is a PermissionContext; non-public objects are then filtered by ownership.
+    # `strategy` picks the output shape, see strategies.STRATEGIES ("auto" decides per query).
+    # `parameterize` ("named" or "positional") lifts literals into placeholders and returns
+    # (sql, params); `params` binds named placeholders already in the input query.
+    # `optimize` filters the outer query by the root-only WHERE conjuncts and joins only the
+    # objects the remaining conjuncts reference. `simplify` normalizes the rewritten WHERE
+    # (see optimizer.normalize); `or_to_in` also turns OR chains of equalities into IN lists.
+    # Explicit JOINs, GROUP BY, HAVING, ORDER BY, LIMIT and OFFSET are kept on the outer query;
+    # top-N queries apply ORDER BY/LIMIT to the matching keys where that gives the same rows.
+    # With the default options, simple SELECT ... FROM ... WHERE queries are rewritten from
+    # their tokens (see fast_path.fast_transform); `fast_path=False` always parses.
+    tracer = tracing.active
+    if tracer is not None:
+        mark = tracer.start()
+
+    read = dialect if read is None else read
+    write = dialect if write is None else write
+    schema = compile_schema(schema)
+    defaults = read is None and write is None and permissions is None and parameterize is None
+    if fast_path and defaults and not (optimize or simplify):
+        transformed = fast_transform(input_query, schema, strategy)
+        if transformed is not None:
+            if tracer is not None:
+                tracer.record(mark, "fast_path")
+            return transformed
+    parsed = parse_one(input_query, read)
+    if not isinstance(parsed, exp.Select):
+        raise ValueError(f"Only SELECT queries are supported, got {parsed.key.upper()}")
+    # Every column is resolved against the outer FROM object, which is wrong inside a subquery
+    if any(node is not parsed for node in parsed.find_all(exp.Query)):
+        raise ValueError("Subqueries are not supported")
+    if tracer is not None:
+        mark = tracer.record(mark, "parse")
 
-def transform_query(input_query, schema, hierarchy):
-    parsed = sqlglot.parse_one(input_query)
-    slugs = ["users", "orders", "items", "categories"]
     # Extract tables
-    present_tables = get_tables_from_query(input_query,parsed)
-    print("pt _____________>",present_tables)
-    # Extract SELECT expressions
+    aliases = table_aliases(parsed, schema)
+    present_tables = get_tables_from_query(parsed, schema, aliases)
+    from_clause = parsed.find(exp.From)
+    if from_clause is None:
+        raise ValueError("Query has no FROM object")
+    table = from_clause.this.name
+    root = schema.table(table)
+    if tracer is not None:
+        mark = tracer.record(mark, "discover")
+
+    # Extract SELECT expressions and the other clauses of the outer query; the objects they
+    # reference are joined there
     select_expressions = parsed.args['expressions']
+    select_tables = {}
+    transformed_select = transform_select(select_expressions, table, schema, select_tables, aliases)
+    explicit_joins = transform_joins(parsed, schema, table, select_tables, aliases)
+    explicit = {join["table"].name for join in explicit_joins}
+    clauses = transform_clauses(parsed, schema, table, select_tables, aliases)
+    if tracer is not None:
+        mark = tracer.record(mark, "select")
 
-    # Extract WHERE clause
+    # Extract WHERE clause. Conditions on the objects the outer query reads (root and explicit
+    # JOINs) filter it directly when optimizing, and always with explicit JOINs: there they
+    # apply per joined row, as written.
     where_clause = parsed.find(exp.Where)
     where_expr = where_clause.this if where_clause else None
+    outer_where = None
+    if where_expr is not None and (optimize or explicit):
+        transformed_where, outer_where, where_tables = push_down(where_expr, schema, table, {table} | explicit, aliases)
+        # The matching-keys subquery joins from the root again, so it cannot filter per joined row
+        rejoined = sorted(explicit & set(where_tables))
+        if rejoined:
+            raise ValueError(f"WHERE paths through the explicitly joined object '{rejoined[0]}' are not supported")
+    elif explicit:
+        transformed_where, where_tables = None, {}
+    else:
+        where_tables = dict.fromkeys(present_tables, True)
+        transformed_where = transform_where_multiple_tables(where_expr, schema, table, where_tables, aliases)
+    if simplify:
+        transformed_where = normalize(transformed_where, or_to_in)
+        outer_where = normalize(outer_where, or_to_in)
+        if optimize and transformed_where is None:
+            # Nothing is left to filter on the joined objects
+            where_tables = {}
+    if tracer is not None:
+        mark = tracer.record(mark, "where")
 
-    if len(present_tables) == 1:
-        table = present_tables[0]
-        transformed_select = transform_select(select_expressions, table, schema)
-
-        if not where_expr:
-            return f"SELECT {transformed_select} FROM {schema[table]['physical_name']}"
-
-        transformed_where = transform_where_multiple_tables(where_expr, schema)
-        return f"""
-        SELECT {transformed_select} 
-        FROM {schema[table]['physical_name']} 
-        WHERE {schema[table]['physical_name']}.{schema[table]['columns']['id']} IN (
-            SELECT DISTINCT {schema[table]['physical_name']}.{schema[table]['columns']['id']} AS id 
-            FROM {schema[table]['physical_name']} 
-            WHERE {transformed_where}
-        )"""
+    plan = QueryPlan(
+        transformed_select,
+        root,
+        transformed_where,
+        joins=schema.planner.plan(table, where_tables),
+        select_joins=_without(schema.planner.plan(table, select_tables), explicit),
+        all_joins=_without(schema.planner.plan(table, {**where_tables, **select_tables}), explicit),
+        permissions=permissions,
+        outer_where=outer_where,
+        explicit_joins=explicit_joins,
+        clauses=clauses,
+    )
+    if tracer is not None:
+        mark = tracer.record(mark, "join")
 
-    elif len(present_tables) == 2:
-        if abs(hierarchy[present_tables[0]] - hierarchy[present_tables[1]]) == 1:
-            transformed_select = transform_select(select_expressions, present_tables[0], schema)
-            transformed_where = transform_where_multiple_tables(where_expr, schema)
-            from_part = str(parsed.args['from'])
-            print("from-->",from_part)
-            table=from_part.split()[1]
-            print("table-->",table)
-            print("present tables-->",present_tables)
-            x = f"ON {[schema[table]['columns']['id']]}"
-            y=list(set(present_tables)-set([table]))[0]
-            print("y-->",y)
-            print("x-->",x)
-            return f"""
-            SELECT {transformed_select} 
-            FROM {schema[table]['physical_name']} 
-            WHERE {schema[table]['physical_name']}.{schema[table]['columns']['id']} IN (
-                SELECT DISTINCT {schema[table]['physical_name']}.{schema[table]['columns']['id']} AS id 
-                FROM {schema[table]['physical_name']} 
-                JOIN {schema[y]['physical_name']} 
-                    ON {schema[y]['physical_name']}.{schema[table]['columns']['id']} = {schema[table]['physical_name']}.id 
-                WHERE {transformed_where}
-            )"""
-
-
-schema = {
-    "users": {
-        "physical_name": "user_master",
-        "is_public": False,
-        "columns": {
-            "id": "user_id",
-            "spending": "total_spend",
-            "budget": "spend_limit",
-            "status": "user_status",
-            "name": "user_name",
-            "orders": {
-                "relation": {"object": "orders", "column": "user_id", "virtual": True},
-            },
-        },
-    },
-    "orders": {
-        "physical_name": "order_details",
-        "is_public": True,
-        "columns": {
-            "id": "order_id",
-            "amount": "order_amount",
-            "status": "order_status",
-            "user_id": {
-                "relation": {"object": "users", "column": "id", "virtual": False},
-            },
-            "items": {
-                "relation": {"object": "items", "column": "order_id", "virtual": True},
-            },
-        },
-    },
-    "items": {
-        "physical_name": "order_item_details",
-        "is_public": True,
-        "columns": {
-            "id": "item_id",
-            "order_id": {
-                "relation": {"object": "orders", "column": "id", "virtual": False},
-            },
-            "product_id": "product_id",
-            "quantity": "item_quantity",
-            "category": {
-                "relation": {"object": "categories", "column": "id", "virtual": False},
-            },
-        },
-    },
-    "categories": {
-        "physical_name": "category_master",
-        "is_public": True,
-        "columns": {
-            "id": "category_id",
-            "name": "category_name",
-            "items": {
-                "relation": {"object": "items", "column": "category", "virtual": True},
-            },
-        },
-    },
-}
+    query = emit(plan, strategy)
+    values = None
+    if parameterize is not None:
+        bound = dict(params or {})
+        if permissions is not None and permissions.bind_owner_ids:
+            bound.update(permissions.bind_params())
+        values = lift_literals(query, parameterize, bound)
+    if isinstance(write, (list, tuple)):
+        # Generators may rewrite the tree, so every dialect but the last gets a copy
+        transformed = {
+            target: generate_query(query, target, parameterize, values, copy=index < len(write) - 1)
+            for index, target in enumerate(write)
+        }
+    else:
+        transformed = generate_query(query, write, parameterize, values)
+    if tracer is not None:
+        tracer.record(mark, "emit")
+    return transformed
 
 heirarchy = {
     "users": 1,
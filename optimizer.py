@@ -0,0 +1,315 @@
+from sqlglot import expressions as exp
+
+from rewriter import rewrite
+
+
+def conjuncts(condition):
+    # a AND (b AND c) AND d -> [a, b, c, d]; anything else is a single conjunct
+    pending = [condition]
+    result = []
+    while pending:
+        node = pending.pop()
+        if isinstance(node, exp.Paren) and isinstance(node.this, exp.And):
+            node = node.this
+        if isinstance(node, exp.And):
+            pending.append(node.right)
+            pending.append(node.left)
+        else:
+            result.append(node)
+    return result
+
+
+def combine(conditions):
+    if not conditions:
+        return None
+    return exp.and_(*conditions, copy=False)
+
+
+def push_down(condition, schema, root, available=None, aliases=None):
+    """
+    Splits a logical WHERE condition by the objects each conjunct references and rewrites it.
+
+    Conjuncts on the root object alone can filter the outer query directly; only the
+    others need the joined objects, so only their objects are joined. `available` widens
+    "the root alone" to every object the outer query reads (the root and explicit JOINs);
+    `aliases` maps the input's table aliases to object names.
+
+    Returns:
+        tuple: (inner, outer, tables) with the rewritten conditions that need joins and those
+        on the root alone (each None when empty), and the objects the inner one references.
+    """
+    available = {root} if available is None else set(available)
+    inner = []
+    outer = []
+    tables = {}
+    for conjunct in conjuncts(condition):
+        referenced = {}
+        rewritten = rewrite(conjunct, schema, root, referenced, aliases)
+        if set(referenced) <= available:
+            outer.append(rewritten)
+        else:
+            inner.append(rewritten)
+            tables.update(referenced)
+    return combine(inner), combine(outer), tables
+
+
+# x op v with the operands swapped: 5 < x is x > 5
+FLIPPED = {exp.GT: exp.LT, exp.LT: exp.GT, exp.GTE: exp.LTE, exp.LTE: exp.GTE, exp.EQ: exp.EQ}
+LOWER_BOUNDS = (exp.GT, exp.GTE)
+UPPER_BOUNDS = (exp.LT, exp.LTE)
+# OR chains of at least this many equalities on one column become IN (...) with or_to_in
+OR_TO_IN_MIN = 3
+
+
+def _number(node):
+    # The value of a numeric literal, including negated ones; None for anything else.
+    # String comparisons are left alone: their ordering and equality depend on the collation.
+    if isinstance(node, exp.Neg):
+        value = _number(node.this)
+        return -value if value is not None else None
+    if isinstance(node, exp.Literal) and not node.is_string:
+        return node.to_py()
+    return None
+
+
+def _comparison(node):
+    # (column, comparison class, value) for `column op number` in either operand order
+    if type(node) not in FLIPPED:
+        return None
+    if isinstance(node.this, exp.Column):
+        value = _number(node.expression)
+        return (node.this, type(node), value) if value is not None else None
+    if isinstance(node.expression, exp.Column):
+        value = _number(node.this)
+        return (node.expression, FLIPPED[type(node)], value) if value is not None else None
+    return None
+
+
+def _fold(node):
+    # Comparisons between two numbers become TRUE or FALSE
+    if type(node) not in FLIPPED and not isinstance(node, exp.NEQ):
+        return node
+    left, right = _number(node.this), _number(node.expression)
+    if left is None or right is None:
+        return node
+    result = {
+        exp.GT: left > right,
+        exp.GTE: left >= right,
+        exp.LT: left < right,
+        exp.LTE: left <= right,
+        exp.EQ: left == right,
+        exp.NEQ: left != right,
+    }[type(node)]
+    return exp.true() if result else exp.false()
+
+
+def _is_bool(node, value):
+    return isinstance(node, exp.Boolean) and node.this is value
+
+
+def _stronger(bound, current, lower):
+    # Whether `bound` (value, strict, node) restricts more than `current`
+    if current is None:
+        return True
+    if bound[0] != current[0]:
+        return bound[0] > current[0] if lower else bound[0] < current[0]
+    return bound[1] and not current[1]
+
+
+class _Merged:
+    # Marks where the merged comparisons of `column` go among the operands of an AND
+    __slots__ = ("column",)
+
+    def __init__(self, column):
+        self.column = column
+
+
+def _merge_ranges(operands):
+    """
+    Merges the comparisons of one column against numbers within an AND.
+
+    x > 5 AND x >= 3 keeps x > 5; x = 4 AND x < 9 keeps x = 4. Returns None when the
+    comparisons contradict each other (x > 5 AND x < 3, x = 1 AND x = 2).
+    """
+    ranges = {}
+    merged = []
+    for operand in operands:
+        comparison = _comparison(operand)
+        if comparison is None:
+            merged.append(operand)
+            continue
+        column, kind, value = comparison
+        state = ranges.get(column)
+        if state is None:
+            state = ranges[column] = {"eq": None, "lower": None, "upper": None}
+            merged.append(_Merged(column))
+        if kind is exp.EQ:
+            if state["eq"] is not None and state["eq"][0] != value:
+                return None
+            state["eq"] = state["eq"] or (value, operand)
+            continue
+        lower = kind in LOWER_BOUNDS
+        bound = (value, kind in (exp.GT, exp.LT), operand)
+        side = "lower" if lower else "upper"
+        if _stronger(bound, state[side], lower):
+            state[side] = bound
+
+    result = []
+    for item in merged:
+        if not isinstance(item, _Merged):
+            result.append(item)
+            continue
+        state = ranges[item.column]
+        lower, upper = state["lower"], state["upper"]
+        if state["eq"] is not None:
+            value, node = state["eq"]
+            if lower is not None and (value < lower[0] or (value == lower[0] and lower[1])):
+                return None
+            if upper is not None and (value > upper[0] or (value == upper[0] and upper[1])):
+                return None
+            result.append(node)
+            continue
+        if lower is not None and upper is not None:
+            if lower[0] > upper[0] or (lower[0] == upper[0] and (lower[1] or upper[1])):
+                return None
+        result.extend(bound[2] for bound in (lower, upper) if bound is not None)
+    return result
+
+
+def _in_values(operand):
+    # (column, values) for `column = constant`, `constant = column` and `column IN (constants)`;
+    # None for every other predicate, which stays in the OR as it is
+    constants = (exp.Literal, exp.Placeholder)
+    if isinstance(operand, exp.EQ):
+        if isinstance(operand.this, exp.Column) and isinstance(operand.expression, constants):
+            return operand.this, [operand.expression]
+        if isinstance(operand.expression, exp.Column) and isinstance(operand.this, constants):
+            return operand.expression, [operand.this]
+        return None
+    if isinstance(operand, exp.In) and isinstance(operand.this, exp.Column):
+        if any(operand.args.get(arg) for arg in ("query", "unnest", "field")):
+            return None
+        if all(isinstance(value, constants) for value in operand.expressions):
+            return operand.this, list(operand.expressions)
+    return None
+
+
+def _or_to_in(operands):
+    # x = 1 OR x = 2 OR x IN (3, 4) -> x IN (1, 2, 3, 4), placed where the first one was
+    values = {}
+    for operand in operands:
+        found = _in_values(operand)
+        if found is not None:
+            values.setdefault(found[0], []).extend(found[1])
+
+    result = []
+    converted = set()
+    for operand in operands:
+        found = _in_values(operand)
+        column = found[0] if found is not None else None
+        if column is None or len(values[column]) < OR_TO_IN_MIN:
+            result.append(operand)
+            continue
+        if column in converted:
+            continue
+        converted.add(column)
+        unique = list(dict.fromkeys(values[column]))
+        result.append(exp.In(this=column, expressions=unique))
+    return result
+
+
+def _connector(node):
+    return exp.And if isinstance(node, exp.And) else exp.Or
+
+
+def _simplify_connector(node, or_to_in):
+    # A frame per connector being simplified: nested connectors of the other kind get a
+    # frame of their own instead of a recursive call, so any nesting depth is fine
+    frames = [{"connector": _connector(node), "operands": [], "pending": [node]}]
+    result = None
+    while True:
+        frame = frames[-1]
+        connector = frame["connector"]
+        pending = frame["pending"]
+        if result is not None:
+            if isinstance(result, connector):
+                # (a OR b) AND TRUE inside an OR: its operands join this chain
+                pending.append(result)
+            else:
+                frame["operands"].append(result)
+            result = None
+
+        # Flatten same-operator chains up to the first nested connector of the other kind
+        nested = None
+        while pending and nested is None:
+            current = pending.pop()
+            while isinstance(current, exp.Paren):
+                current = current.this
+            if isinstance(current, connector):
+                pending.append(current.expression)
+                pending.append(current.this)
+            elif isinstance(current, exp.Connector):
+                nested = current
+            else:
+                frame["operands"].append(_fold(current))
+        if nested is not None:
+            frames.append({"connector": _connector(nested), "operands": [], "pending": [nested]})
+            continue
+
+        frames.pop()
+        result = _combine_operands(frame["operands"], connector is exp.And, or_to_in)
+        if not frames:
+            return result
+
+
+def _combine_operands(operands, is_and, or_to_in):
+    # TRUE is neutral in an AND and decides an OR; FALSE the other way round
+    neutral, absorbing = (True, False) if is_and else (False, True)
+    unique = []
+    seen = set()
+    for operand in operands:
+        if _is_bool(operand, absorbing):
+            return exp.true() if absorbing else exp.false()
+        if _is_bool(operand, neutral) or operand in seen:
+            continue
+        seen.add(operand)
+        unique.append(operand)
+
+    if is_and:
+        unique = _merge_ranges(unique)
+        if unique is None:
+            return exp.false()
+    elif or_to_in:
+        unique = _or_to_in(unique)
+
+    if not unique:
+        return exp.true() if is_and else exp.false()
+    if len(unique) == 1:
+        return unique[0]
+    combine_operands = exp.and_ if is_and else exp.or_
+    return combine_operands(*unique, copy=False)
+
+
+def normalize(condition, or_to_in=False):
+    """
+    Normalizes a WHERE condition: flattens nested AND/OR chains, drops duplicate
+    predicates, folds comparisons between numbers and TRUE/FALSE operands, and merges
+    range comparisons on the same column (see `_merge_ranges`).
+
+    Only the AND/OR tree of the WHERE is rewritten, never what is below a NOT or inside
+    other expressions, so turning a contradiction (NULL for NULL columns) into FALSE does
+    not change which rows pass. With `or_to_in`, OR chains of OR_TO_IN_MIN or more
+    equalities on one column become a single IN list.
+
+    Returns:
+        The simplified condition, or None when it is always true.
+    """
+    if condition is None:
+        return None
+    while isinstance(condition, exp.Paren) and isinstance(condition.this, (exp.Connector, exp.Paren)):
+        condition = condition.this
+    if isinstance(condition, exp.Connector):
+        condition = _simplify_connector(condition, or_to_in)
+    else:
+        condition = _fold(condition)
+    return None if _is_bool(condition, True) else condition
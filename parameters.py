@@ -0,0 +1,92 @@
+from sqlglot import expressions as exp
+
+from dialects import generate, placeholder_pattern
+
+STYLES = ("named", "positional")
+PARAM_PREFIX = "__param"
+
+
+class InlineParameterError(ValueError):
+    """A placeholder that has to stay inline (e.g. LIMIT :n) is bound to a value SQL cannot spell."""
+
+
+def keeps_literal(node):
+    # Literals whose position means more than their value stay in the SQL text: ordinals in
+    # GROUP/ORDER BY, SELECT 1 projections, LIMIT/OFFSET counts, INTERVAL and type arguments
+    parent = node.parent
+    if isinstance(parent, (exp.Group, exp.Ordered, exp.Limit, exp.Offset, exp.Interval, exp.DataTypeParam)):
+        return True
+    return isinstance(parent, exp.Select) and node.arg_key == "expressions"
+
+
+def lift_literals(query, style="named", params=None):
+    """
+    Replaces the literals of an emitted query with numbered bind placeholders.
+
+    Args:
+        query (exp.Expression): The query to parameterize, modified in place.
+        style (str): "named" or "positional", see `render`.
+        params (dict): Values of named placeholders already in the query; these become
+            parameters as well. Other named placeholders are left alone in named style.
+
+    Returns:
+        list: The parameter values, indexed by placeholder number.
+    """
+    if style not in STYLES:
+        raise ValueError(f"Unknown parameter style '{style}', expected one of {STYLES}")
+    params = params or {}
+
+    values = []
+    for node in list(query.find_all(exp.Literal, exp.Placeholder)):
+        if isinstance(node, exp.Placeholder):
+            if node.name not in params:
+                if style == "positional":
+                    raise ValueError(f"No value for placeholder '{node.name}' in positional style")
+                continue
+            if keeps_literal(node):
+                try:
+                    literal = exp.convert(params[node.name])
+                except ValueError:
+                    raise InlineParameterError(
+                        f"Placeholder '{node.name}' has to stay inline, but its value cannot be written as SQL"
+                    ) from None
+                node.replace(literal)
+                continue
+            value = params[node.name]
+        elif keeps_literal(node):
+            continue
+        else:
+            value = node.to_py()
+        node.replace(exp.Placeholder(this=f"{PARAM_PREFIX}{len(values)}"))
+        values.append(value)
+    return values
+
+
+def render(query, values, style="named", dialect=None, copy=False):
+    """
+    Generates a query parameterized by `lift_literals` for one dialect.
+
+    Named style emits p0, p1, ... and positional style anonymous placeholders, both the
+    dialect's way (:p0 or %(p0)s, ? or %s).
+
+    Returns:
+        tuple: (sql, params) where params is a dict for named style and a list in
+        placeholder order for positional style.
+    """
+    sql = generate(query, dialect, copy=copy)
+    if not values:
+        return sql, {} if style == "named" else []
+
+    # Number the parameters in text order: the generator does not always follow tree order
+    ordered = []
+
+    def replace(match):
+        ordered.append(values[int(match.group(1))])
+        if style == "positional":
+            return generate(exp.Placeholder(), dialect)
+        return generate(exp.Placeholder(this=f"p{len(ordered) - 1}"), dialect)
+
+    sql = placeholder_pattern(PARAM_PREFIX, dialect).sub(replace, sql)
+    if style == "positional":
+        return sql, ordered
+    return sql, {f"p{index}": value for index, value in enumerate(ordered)}
@@ -0,0 +1,145 @@
+from sqlglot import expressions as exp
+
+OWNERSHIP_TABLE = "record_ownership"
+STRATEGIES = ("exists", "semi_join")
+
+
+class PermissionContext:
+    """
+    Who is asking, and how record ownership is enforced for non-public objects.
+
+    Args:
+        org_id (str): Organisation the records must belong to.
+        owner_ids (list): Owners whose records are visible. None skips the owner check,
+            an empty list hides every record.
+        check_permissions (bool): Whether to filter at all.
+        strategy (str): "exists" adds an EXISTS (SELECT 1 FROM record_ownership ...) filter
+            per row; "semi_join" joins a pre-filtered ownership CTE instead.
+        values_threshold (int): Owner lists longer than this are emitted as a VALUES
+            relation instead of an IN list.
+        bind_owner_ids (bool): Emit :owner_0, :owner_1, ... placeholders instead of the ids;
+            bind them with `bind_params()`.
+    """
+
+    __slots__ = ("org_id", "owner_ids", "check_permissions", "strategy", "values_threshold", "bind_owner_ids")
+
+    def __init__(
+        self,
+        org_id=None,
+        owner_ids=None,
+        check_permissions=True,
+        strategy="exists",
+        values_threshold=100,
+        bind_owner_ids=False,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown permission strategy '{strategy}', expected one of {STRATEGIES}")
+        self.org_id = org_id
+        self.owner_ids = tuple(owner_ids) if owner_ids is not None else None
+        self.check_permissions = check_permissions
+        self.strategy = strategy
+        self.values_threshold = values_threshold
+        self.bind_owner_ids = bind_owner_ids
+
+    def _key(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, PermissionContext) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"PermissionContext({fields})"
+
+    def applies_to(self, table):
+        return self.check_permissions and not table.is_public
+
+    def bind_params(self):
+        return {f"owner_{index}": owner for index, owner in enumerate(self.owner_ids or ())}
+
+
+def _owner_values(context):
+    if context.bind_owner_ids:
+        return [exp.Placeholder(this=f"owner_{index}") for index in range(len(context.owner_ids))]
+    return [exp.convert(owner) for owner in context.owner_ids]
+
+
+def _owner_filter(owner, context):
+    if context.owner_ids is None:
+        return None
+    if not context.owner_ids:
+        return exp.false()
+    values = _owner_values(context)
+    if len(values) <= context.values_threshold:
+        return owner.isin(*values)
+    # Long lists as a VALUES relation: one hash semi-join instead of a huge IN list
+    owners = exp.values([(value,) for value in values], alias="owners", columns=["owner"])
+    return owner.isin(query=exp.select("owners.owner").from_(owners, copy=False), copy=False)
+
+
+def ownership_conditions(table, context, alias="ro"):
+    # ro.org_id = ... AND ro.object_id = ... AND ro.owner IN (...) AND (not expired)
+    conditions = []
+    if context.org_id is not None:
+        conditions.append(exp.column("org_id", table=alias).eq(exp.convert(context.org_id)))
+    conditions.append(exp.column("object_id", table=alias).eq(exp.convert(table.object_id)))
+    owner_filter = _owner_filter(exp.column("owner", table=alias), context)
+    if owner_filter is not None:
+        conditions.append(owner_filter)
+    expires_at = exp.column("expires_at", table=alias)
+    now = exp.Extract(this=exp.var("EPOCH"), expression=exp.CurrentTimestamp())
+    conditions.append(exp.paren(exp.or_(expires_at.is_(exp.null()), expires_at > now, copy=False), copy=False))
+    return conditions
+
+
+def ownership_exists(table, context):
+    # EXISTS (SELECT 1 FROM record_ownership ro WHERE ro.record_id = <table>.<pk> AND ...)
+    record = exp.column("record_id", table="ro").eq(
+        exp.column(table.primary_key.physical_name, table=table.physical_name)
+    )
+    subquery = (
+        exp.select("1")
+        .from_(exp.to_table(OWNERSHIP_TABLE, alias="ro"), copy=False)
+        .where(exp.and_(record, *ownership_conditions(table, context), copy=False), copy=False)
+    )
+    return exp.Exists(this=subquery)
+
+
+def ownership_cte(table, context):
+    # owned_<table> AS (SELECT DISTINCT ro.record_id FROM record_ownership ro WHERE ...)
+    name = f"owned_{table.physical_name}"
+    query = (
+        exp.select(exp.column("record_id", table="ro"))
+        .distinct(copy=False)
+        .from_(exp.to_table(OWNERSHIP_TABLE, alias="ro"), copy=False)
+        .where(exp.and_(*ownership_conditions(table, context), copy=False), copy=False)
+    )
+    on = exp.column("record_id", table=name).eq(exp.column(table.primary_key.physical_name, table=table.physical_name))
+    return name, query, on
+
+
+def plan_permissions(context, tables, ctes):
+    """
+    Ownership checks for the private objects among `tables`.
+
+    Returns:
+        tuple: (filters, joins) to add to the query that reads `tables`. CTEs the joins
+        refer to are added to the `ctes` dict (name -> query).
+    """
+    filters = []
+    joins = []
+    if context is None:
+        return filters, joins
+    for table in tables:
+        if not context.applies_to(table):
+            continue
+        if context.strategy == "exists":
+            filters.append(ownership_exists(table, context))
+        else:
+            name, query, on = ownership_cte(table, context)
+            ctes.setdefault(name, query)
+            joins.append((exp.to_table(name), on))
+    return filters, joins
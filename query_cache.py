@@ -0,0 +1,424 @@
+import hashlib
+import importlib
+import os
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from sqlglot import __version__ as sqlglot_version
+from sqlglot import expressions as exp
+from sqlglot.errors import ParseError
+from sqlglot.tokens import TokenType
+
+from compiled_schema import compile_schema
+from dialects import generate, parse_one, placeholder_pattern, tokenizer
+from main import transform_query
+from parameters import InlineParameterError, keeps_literal
+
+LITERAL_TOKENS = (TokenType.STRING, TokenType.NUMBER)
+MARKER_PREFIX = "__lit"
+# Cached in place of a parameterized template for shapes whose literals cannot all become
+# parameters (LIMIT 10, ORDER BY 1): those are cached per literal values instead
+INLINE_LITERALS = "inline-literals"
+# Cached for shapes transform_query rejects whatever their literals, which then skip the cache
+UNCACHEABLE = "uncacheable"
+# Modules whose code decides the rewritten SQL: templates on disk are keyed on their source
+REWRITE_MODULES = (
+    "compiled_schema",
+    "dialects",
+    "fast_path",
+    "join_planner",
+    "main",
+    "optimizer",
+    "parameters",
+    "permissions",
+    "query_cache",
+    "rewriter",
+    "strategies",
+)
+
+
+def fingerprint_query(input_query, dialect=None):
+    """
+    Tokenizes the query and strips its literals.
+
+    Returns:
+        tuple: (fingerprint, literals) where fingerprint is a digest of the literal-free
+        token stream, comments included, and literals are the literal tokens of the input, in order of appearance.
+    """
+    shape = []
+    literals = []
+    for token in tokenizer(dialect).tokenize(input_query):
+        if token.token_type in LITERAL_TOKENS:
+            shape.append(f"{token.token_type.name}:{token.comments}")
+            literals.append(token)
+        else:
+            # Comments are copied into the output, so queries differing in them must not share it
+            shape.append(f"{token.token_type.name}:{token.text}:{token.comments}")
+    digest = hashlib.sha1("\x1f".join(shape).encode()).hexdigest()
+    return digest, literals
+
+
+def literal_value(token):
+    # The Python value of a literal token, as Literal.to_py() gives it for the parsed literal
+    if token.token_type == TokenType.STRING:
+        return token.text
+    return exp.Literal.number(token.text).to_py()
+
+
+def mark_literals(input_query, tokens, keep=()):
+    # Replace every literal token, except the indices in `keep`, with a named placeholder
+    # the rewriter passes through untouched
+    pieces = []
+    last = 0
+    for index, token in enumerate(tokens):
+        if index in keep:
+            continue
+        pieces.append(input_query[last:token.start])
+        pieces.append(f":{MARKER_PREFIX}{index}")
+        last = token.end + 1
+    pieces.append(input_query[last:])
+    return "".join(pieces)
+
+
+def inline_literals(input_query, tokens, dialect=None):
+    """
+    Indices of the literal tokens that stay in the SQL text of a template: those in a
+    position parameters.keeps_literal keeps (LIMIT 10, INTERVAL '1' DAY, ORDER BY 1) and
+    any the parser does not read as a Literal.
+    """
+    keeps = {}
+    for node in parse_one(input_query, dialect).find_all(exp.Literal):
+        if "start" in node.meta:
+            keeps[node.meta["start"]] = keeps_literal(node)
+    return tuple(index for index, token in enumerate(tokens) if keeps.get(token.start, True))
+
+
+def compile_template(marked_output, literal_count, dialect=None):
+    # Markers are found the way the output dialect writes placeholders (:__lit0, %(__lit0)s, ...)
+    if isinstance(marked_output, dict):
+        templates = {target: compile_template(sql, literal_count, target) for target, sql in marked_output.items()}
+        return None if None in templates.values() else templates
+    parts = []
+    slots = []
+    last = 0
+    for match in placeholder_pattern(MARKER_PREFIX, dialect).finditer(marked_output):
+        index = int(match.group(1))
+        if index >= literal_count:
+            return None
+        parts.append(marked_output[last:match.start()])
+        slots.append(index)
+        last = match.end()
+    parts.append(marked_output[last:])
+    return tuple(parts), tuple(slots)
+
+
+class Slot:
+    """Stands in for a value only known per call: an input literal or a caller's bind value."""
+
+    __slots__ = ("kind", "key")
+
+    def __init__(self, kind, key):
+        self.kind = kind
+        self.key = key
+
+
+def compile_parameterized(result):
+    # (sql, names, values) where values may hold Slots; names is None for positional style
+    if isinstance(result, dict):
+        return {target: compile_parameterized(output) for target, output in result.items()}
+    sql, lifted = result
+    if isinstance(lifted, dict):
+        return sql, tuple(lifted), tuple(lifted.values())
+    return sql, None, tuple(lifted)
+
+
+def bind_parameterized(template, literals, params):
+    if isinstance(template, dict):
+        return {target: bind_parameterized(output, literals, params) for target, output in template.items()}
+    sql, names, values = template
+    bound = []
+    for value in values:
+        if isinstance(value, Slot):
+            value = literal_value(literals[value.key]) if value.kind == "literal" else params[value.key]
+        bound.append(value)
+    if names is None:
+        return sql, bound
+    return sql, dict(zip(names, bound))
+
+
+def render_literal(token, dialect=None):
+    # The literal as the write dialect spells it, e.g. MySQL's "active" as Postgres' 'active'
+    if token.token_type == TokenType.STRING:
+        return generate(exp.Literal.string(token.text), dialect)
+    return generate(exp.Literal.number(token.text), dialect)
+
+
+def bind_template(template, literals, dialect=None):
+    # `literals` are the literal tokens of the input, rendered for each write dialect
+    if isinstance(template, dict):
+        return {target: bind_template(output, literals, target) for target, output in template.items()}
+    parts, slots = template
+    pieces = [parts[0]]
+    for index, part in zip(slots, parts[1:]):
+        pieces.append(render_literal(literals[index], dialect))
+        pieces.append(part)
+    return "".join(pieces)
+
+
+def encode_template(template):
+    # Templates as plain tagged tuples a DiskCache can store without pickle
+    if isinstance(template, Slot):
+        return ("slot", template.kind, template.key)
+    if isinstance(template, tuple):
+        return ("tuple", tuple(encode_template(item) for item in template))
+    if isinstance(template, dict):
+        return ("dict", tuple((key, encode_template(value)) for key, value in template.items()))
+    if isinstance(template, Decimal):
+        return ("decimal", str(template))
+    if template is None or isinstance(template, (str, int, float)):
+        return ("value", template)
+    raise TypeError(f"Cannot encode {type(template).__name__} in a template")
+
+
+def decode_template(encoded):
+    tag, *body = encoded
+    if tag == "slot":
+        return Slot(*body)
+    if tag == "tuple":
+        return tuple(decode_template(item) for item in body[0])
+    if tag == "dict":
+        return {key: decode_template(value) for key, value in body[0]}
+    if tag == "decimal":
+        return Decimal(body[0])
+    if tag == "value":
+        return body[0]
+    raise ValueError(f"Unknown template tag {tag!r}")
+
+
+def code_version():
+    """Digest of sqlglot's version and the source of REWRITE_MODULES."""
+    digest = hashlib.sha1(sqlglot_version.encode())
+    for name in REWRITE_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of compiled rewrite templates.
+
+    Entries are keyed on (schema version, query fingerprint, rewrite options), so queries
+    that only differ in their literals share one template. An optional `backing` cache
+    (e.g. a disk_cache.DiskCache shared by the processes on the host) is read on a miss
+    and written on every put, with templates in the form of `encode_template`; entries it
+    cannot decode are misses.
+    """
+
+    def __init__(self, maxsize=1024, backing=None):
+        self.maxsize = maxsize
+        self.backing = backing
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+        if self.backing is not None:
+            encoded = self.backing.get(key)
+            if encoded is not None:
+                try:
+                    template = decode_template(encoded)
+                except (ValueError, TypeError, IndexError):
+                    return None
+                self._remember(key, template)
+        return template
+
+    def put(self, key, template):
+        self._remember(key, template)
+        if self.backing is not None:
+            try:
+                encoded = encode_template(template)
+            except TypeError:
+                # e.g. a caller's bind value of a type the disk format has no tag for
+                return
+            self.backing.put(key, encoded)
+
+    def _remember(self, key, template):
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+        if self.backing is not None:
+            stats["backing"] = self.backing.stats()
+        return stats
+
+    def __len__(self):
+        return len(self._entries)
+
+
+default_cache = QueryCache()
+
+
+def use_disk_cache(path, max_bytes=None):
+    """
+    Puts a DiskCache at `path` behind `default_cache`; None removes it. `max_bytes`
+    defaults to disk_cache.DEFAULT_MAX_BYTES.
+    """
+    backing = default_cache.backing
+    if path is None:
+        default_cache.backing = None
+        return None
+    # sqlite3 is only loaded by processes that use the disk tier
+    from disk_cache import DEFAULT_MAX_BYTES, DiskCache
+
+    max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+    if backing is None or backing.path != os.fspath(path) or backing.max_bytes != max_bytes:
+        # Templates written by other code could differ from what this code emits
+        default_cache.backing = DiskCache(path, max_bytes, namespace=code_version())
+    return default_cache.backing
+
+
+def _options_key(options):
+    # A list of write dialects is hashed as a tuple
+    return tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in options.items()))
+
+
+def _dialects(options):
+    # (read, write) dialects as transform_query resolves them
+    dialect = options.get("dialect")
+    read = options.get("read")
+    write = options.get("write")
+    return dialect if read is None else read, dialect if write is None else write
+
+
+def _cached_parameterized(input_query, schema, hierarchy, cache, params, options):
+    # Parameterized output is the same SQL for every literal value, so the template is the
+    # final SQL plus where each parameter value comes from
+    fingerprint, tokens = fingerprint_query(input_query, _dialects(options)[0])
+    key = (schema.version, fingerprint, _options_key(options), tuple(sorted(params)))
+    texts = (tuple(token.text for token in tokens),)
+    if options.get("simplify"):
+        # Simplification depends on the literal values, so the template is for these ones only
+        exact = True
+        key += texts
+        template = cache.get(key)
+    else:
+        template = cache.get(key)
+        exact = template == INLINE_LITERALS
+        if exact:
+            key += texts
+            template = cache.get(key)
+    if template is not None:
+        return bind_parameterized(template, tokens, params)
+
+    slots = {name: Slot("param", name) for name in params}
+    marked = input_query
+    if not exact:
+        slots.update((f"{MARKER_PREFIX}{index}", Slot("literal", index)) for index in range(len(tokens)))
+        marked = mark_literals(input_query, tokens)
+    try:
+        result = transform_query(marked, schema, hierarchy, params=slots, **options)
+    except InlineParameterError:
+        if exact:
+            # One of the caller's parameters has to stay inline, so the SQL depends on its value
+            return transform_query(input_query, schema, hierarchy, params=params, **options)
+        cache.put(key, INLINE_LITERALS)
+        return _cached_parameterized(input_query, schema, hierarchy, cache, params, options)
+    except ParseError:
+        if exact:
+            raise
+        # A literal position that cannot hold a placeholder, e.g. DECIMAL(10, 2)
+        cache.put(key, INLINE_LITERALS)
+        return _cached_parameterized(input_query, schema, hierarchy, cache, params, options)
+
+    template = compile_parameterized(result)
+    cache.put(key, template)
+    return bind_parameterized(template, tokens, params)
+
+
+def cached_transform_query(input_query, schema, hierarchy=None, cache=None, params=None, **options):
+    cache = default_cache if cache is None else cache
+    schema = compile_schema(schema)
+    if options.get("parameterize") is not None:
+        return _cached_parameterized(input_query, schema, hierarchy, cache, params or {}, options)
+
+    read, write = _dialects(options)
+    fingerprint, tokens = fingerprint_query(input_query, read)
+    key = (schema.version, fingerprint, _options_key(options))
+    texts = tuple(token.text for token in tokens)
+    if options.get("simplify"):
+        # Simplification depends on the literal values (x > 5 AND x > 3), so the result is
+        # cached for this query exactly
+        key += (texts,)
+        result = cache.get(key)
+        if result is None:
+            result = transform_query(input_query, schema, hierarchy, **options)
+            cache.put(key, result)
+        return result
+
+    # A shape with literals that stay inline keeps (INLINE_LITERALS, indices) under its key
+    # and a template per value of those literals
+    entry = cache.get(key)
+    if entry == UNCACHEABLE:
+        return transform_query(input_query, schema, hierarchy, **options)
+    inline = entry[1] if isinstance(entry, tuple) and entry[0] == INLINE_LITERALS else None
+    template_key = key
+    if inline is not None:
+        template_key = key + (tuple(texts[index] for index in inline),)
+        entry = cache.get(template_key)
+    if entry is not None:
+        return bind_template(entry, tokens, write)
+
+    try:
+        transformed = transform_query(input_query, schema, hierarchy, **options)
+    except ParseError:
+        # e.g. 0x1F: every query of this shape fails to parse
+        cache.put(key, UNCACHEABLE)
+        raise
+    if inline is None:
+        inline = inline_literals(input_query, tokens, read)
+        if inline:
+            cache.put(key, (INLINE_LITERALS, inline))
+            template_key = key + (tuple(texts[index] for index in inline),)
+
+    # Rewrite the shape once with the other literals as placeholders and remember where they go
+    try:
+        marked = transform_query(mark_literals(input_query, tokens, inline), schema, hierarchy, **options)
+    except (ParseError, ValueError):
+        # A literal position that cannot hold a placeholder: cache the shape per literal values
+        marked = None
+    template = compile_template(marked, len(tokens), write) if marked is not None else None
+    if template is None or bind_template(template, tokens, write) != transformed:
+        # Some literal is written differently as a placeholder in the write dialect
+        inline = tuple(range(len(tokens)))
+        cache.put(key, (INLINE_LITERALS, inline))
+        template_key = key + (texts,)
+        template = compile_template(transformed, 0, write)
+    if template is not None:
+        cache.put(template_key, template)
+    return transformed
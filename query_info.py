@@ -0,0 +1,183 @@
+from sqlglot import expressions as exp
+
+from dialects import parse_one
+from main import extract_operators
+from rewriter import column_parts
+
+
+class _lazy:
+    """A QueryInfo field computed on first access and kept in the `_<name>` slot."""
+
+    def __init__(self, compute):
+        self.compute = compute
+        self.slot = f"_{compute.__name__}"
+        self.__doc__ = compute.__doc__
+
+    def __get__(self, info, owner=None):
+        if info is None:
+            return self
+        try:
+            return getattr(info, self.slot)
+        except AttributeError:
+            value = self.compute(info)
+            setattr(info, self.slot, value)
+            return value
+
+
+class QueryInfo:
+    """
+    Facts about one SELECT, each computed from the parsed tree the first time it is read.
+
+    Nothing is stringified: fields hold the tree's own nodes, so a caller that only looks at
+    `tables` pays for one walk over the tree and nothing else. The tree must not be modified
+    while the QueryInfo is in use.
+
+    Args:
+        query: SQL text or an already parsed expression.
+        dialect (str): Dialect to parse SQL text with.
+    """
+
+    __slots__ = (
+        "tree",
+        "_select",
+        "_tables",
+        "_aliases",
+        "_root",
+        "_joins",
+        "_columns",
+        "_where",
+        "_operators",
+        "_aggregates",
+        "_group_by",
+        "_having",
+        "_order_by",
+        "_limit",
+        "_offset",
+    )
+
+    def __init__(self, query, dialect=None):
+        self.tree = parse_one(query, dialect) if isinstance(query, str) else query
+
+    def __repr__(self):
+        return f"QueryInfo({self.tree.sql()!r})"
+
+    @_lazy
+    def select(self):
+        """
+        The SELECT list, as [(output name, expression)] in order; unnamed ones are named by
+        position. Names may repeat (SELECT COUNT(*), COUNT(*)).
+        """
+        return [
+            (expression.alias_or_name or str(index), expression)
+            for index, expression in enumerate(self.tree.expressions)
+        ]
+
+    @_lazy
+    def tables(self):
+        """Every table the query reads, as [{"name", "alias"}] in order of appearance."""
+        return [{"name": table.name, "alias": table.alias or None} for table in self.tree.find_all(exp.Table)]
+
+    @_lazy
+    def aliases(self):
+        """{alias: table name} for aliased tables."""
+        return {table["alias"]: table["name"] for table in self.tables if table["alias"]}
+
+    @_lazy
+    def root(self):
+        """The FROM table's name, which unqualified columns belong to; None without FROM."""
+        from_clause = self.tree.args.get("from_")
+        return from_clause.this.name if from_clause is not None else None
+
+    @_lazy
+    def joins(self):
+        """The JOINs as [{"name", "alias", "kind", "on"}]; kind is e.g. "LEFT" or "" for plain JOIN."""
+        joins = []
+        for join in self.tree.args.get("joins") or ():
+            kind = " ".join(part for part in (join.side, join.kind) if part)
+            joins.append({
+                "name": join.this.name,
+                "alias": join.this.alias or None,
+                "kind": kind,
+                "on": join.args.get("on"),
+            })
+        return joins
+
+    @_lazy
+    def columns(self):
+        """
+        Column names per table, {qualifier: [name, ...]}. Aliases are resolved, unqualified
+        columns are listed under the root and relation paths under their dotted path
+        ("orders.items" for orders.items.quantity). References to SELECT aliases are not columns.
+        """
+        projected = {expression.alias for expression in self.tree.expressions if isinstance(expression, exp.Alias)}
+        columns = {}
+        for column in self.tree.find_all(exp.Column):
+            if isinstance(column.this, exp.Star):
+                continue
+            parts = column_parts(column)
+            if len(parts) == 1:
+                if parts[0] in projected:
+                    continue
+                qualifier = self.root
+            else:
+                qualifier = ".".join([self.aliases.get(parts[0], parts[0])] + parts[1:-1])
+            names = columns.setdefault(qualifier, [])
+            if parts[-1] not in names:
+                names.append(parts[-1])
+        return columns
+
+    @_lazy
+    def where(self):
+        """The WHERE condition, or None."""
+        where = self.tree.args.get("where")
+        return where.this if where is not None else None
+
+    @_lazy
+    def operators(self):
+        """The WHERE's AND/OR and comparison operators, see `main.extract_operators`."""
+        return extract_operators(self.where) if self.where is not None else []
+
+    @_lazy
+    def aggregates(self):
+        """Aggregate calls anywhere in the query (COUNT, SUM, ...)."""
+        return list(self.tree.find_all(exp.AggFunc))
+
+    @_lazy
+    def group_by(self):
+        """The GROUP BY expressions."""
+        group = self.tree.args.get("group")
+        return list(group.expressions) if group is not None else []
+
+    @_lazy
+    def having(self):
+        """The HAVING condition, or None."""
+        having = self.tree.args.get("having")
+        return having.this if having is not None else None
+
+    @_lazy
+    def order_by(self):
+        """The ORDER BY keys as [{"expression", "descending"}]."""
+        order = self.tree.args.get("order")
+        if order is None:
+            return []
+        return [
+            {"expression": ordered.this, "descending": bool(ordered.args.get("desc"))}
+            for ordered in order.expressions
+        ]
+
+    @_lazy
+    def limit(self):
+        """The LIMIT count: its value when it is a literal, else the expression; None without LIMIT."""
+        return _count(self.tree.args.get("limit"))
+
+    @_lazy
+    def offset(self):
+        """The OFFSET count, like `limit`."""
+        return _count(self.tree.args.get("offset"))
+
+
+def _count(clause):
+    if clause is None:
+        return None
+    count = clause.expression
+    return count.to_py() if isinstance(count, exp.Literal) else count
@@ -0,0 +1,97 @@
+from sqlglot import expressions as exp
+
+
+def column_parts(column):
+    # ["orders", "items", "quantity"] for orders.items.quantity; quoted paths such as
+    # "orders.items.category.name" arrive as one identifier and are split on the dots
+    parts = [part.name for part in column.parts]
+    if len(parts) == 1:
+        return parts[0].split(".")
+    return parts
+
+
+def dotted_parts(dot):
+    # sqlglot keeps four parts on a Column and nests the rest as Dot(Dot(Column, e), f); such a
+    # chain of plain names is a longer relation path. None for any other use of Dot.
+    names = []
+    node = dot
+    while isinstance(node, exp.Dot):
+        if not isinstance(node.expression, exp.Identifier):
+            return None
+        names.append(node.expression.name)
+        node = node.this
+    if not isinstance(node, exp.Column) or isinstance(node.this, exp.Star):
+        return None
+    return [part.name for part in node.parts] + names[::-1]
+
+
+class SchemaTransformer:
+    """
+    Rewrites logical column and table references to their physical names.
+
+    Used as the callback of `Expression.transform`, so every node of the tree is visited
+    once and replaced in place; unqualified columns belong to `default_table`. The objects
+    that rewritten columns resolve to are collected in `referenced`. `aliases` maps table
+    aliases of the input to object names; unqualified columns named in `keep` (SELECT
+    aliases referenced by ORDER BY, for instance) are left as they are.
+    """
+
+    def __init__(self, schema, default_table=None, referenced=None, aliases=None, keep=()):
+        self.schema = schema
+        self.default_table = default_table
+        self.referenced = {} if referenced is None else referenced
+        self.aliases = aliases or {}
+        self.keep = keep
+
+    def __call__(self, node):
+        if isinstance(node, exp.Column):
+            return self.transform_column(node)
+        if isinstance(node, exp.Table):
+            return self.transform_table(node)
+        if isinstance(node, exp.Dot):
+            parts = dotted_parts(node)
+            if parts is not None:
+                return self.transform_path(parts)
+        return node
+
+    def transform_column(self, column):
+        if isinstance(column.this, exp.Star):
+            return self.transform_star(column)
+        parts = column_parts(column)
+        if len(parts) == 1 and (not self.default_table or parts[0] in self.keep):
+            return column
+        return self.transform_path(parts)
+
+    def transform_path(self, parts):
+        if len(parts) > 1 and parts[0] in self.aliases:
+            parts = [self.aliases[parts[0]]] + parts[1:]
+        table, column_name, path = self.schema.resolve_column(parts, self.default_table)
+        for name in path:
+            self.referenced[name] = True
+
+        record = table.columns.get(column_name)
+        if record is not None and record.is_relation and record.qualified is None:
+            raise ValueError(f"'{table.name}.{column_name}' is a relation to '{record.relation.target}', not a column")
+        physical_name = record.physical_name if record is not None else column_name
+        return exp.column(physical_name, table=table.physical_name)
+
+    def transform_star(self, column):
+        # users.* -> user_master.*
+        name = self.aliases.get(column.table, column.table)
+        if name not in self.schema.tables:
+            return column
+        self.referenced[name] = True
+        return exp.Column(this=exp.Star(), table=exp.to_identifier(self.schema.tables[name].physical_name))
+
+    def transform_table(self, table):
+        if table.name not in self.schema.tables:
+            return table
+        physical = exp.to_table(self.schema.tables[table.name].physical_name)
+        if table.alias:
+            physical.set("alias", table.args["alias"])
+        return physical
+
+
+def rewrite(expression, schema, default_table=None, referenced=None, aliases=None, keep=()):
+    # Rewrites the tree in place and returns its (possibly replaced) root
+    return expression.transform(SchemaTransformer(schema, default_table, referenced, aliases, keep), copy=False)
@@ -2,6 +2,7 @@ schema = {
     "users": {
         "physical_name": "user_master",
         "is_public": False,
+        "object_id": "usr_123",
         "columns": {
             "id": "user_id",
             "spending": "total_spend",
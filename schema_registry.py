@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import threading
+
+from compiled_schema import CompiledSchema, table_digest
+
+logger = logging.getLogger("sql_parser.schema")
+
+
+def load_schema_file(path):
+    """
+    Reads one schema file: a mapping of object name to spec, in the shape of `schema.schema`.
+
+    Files ending in .yaml or .yml are read with PyYAML, everything else as JSON.
+    """
+    with open(path, encoding="utf-8") as file:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError(f"Reading '{path}' requires PyYAML (pip install pyyaml)") from None
+            tables = yaml.safe_load(file) or {}
+        else:
+            tables = json.load(file)
+    if not isinstance(tables, dict):
+        raise ValueError(f"'{path}' must map object names to their specs")
+    return tables
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SchemaRegistry:
+    """
+    The live CompiledSchema for a set of JSON/YAML schema files, rebuilt when they change.
+
+    Objects may be spread over several files but defined only once. A reload re-reads the
+    changed files, recompiles only the objects affected by the change and then swaps the
+    new version in with a single reference assignment. Callers pin a version by taking
+    `current()` once per request; cache entries are keyed on the version, so they stay
+    with the schema they were built from.
+
+    Args:
+        paths (list): Schema files, or a single path.
+        poll_interval (float): Seconds between change checks once `start()` is called.
+    """
+
+    def __init__(self, paths, poll_interval=1.0):
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        self.paths = [os.fspath(path) for path in paths]
+        self.poll_interval = poll_interval
+        self.last_error = None
+        self._files = {}
+        self._current = None
+        # Serializes reloads; readers never take it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reload()
+
+    def current(self):
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version
+
+    def reload(self):
+        """
+        Re-reads the files that changed on disk since the last load.
+
+        Returns:
+            bool: Whether a new version was swapped in. On error the current version stays.
+        """
+        with self._lock:
+            files = {}
+            changed = False
+            for path in self.paths:
+                stamp = _stamp(path)
+                entry = self._files.get(path)
+                if entry is None or entry[0] != stamp:
+                    tables = load_schema_file(path)
+                    entry = (stamp, tables, {name: table_digest(spec) for name, spec in tables.items()})
+                    changed = True
+                files[path] = entry
+            if not changed:
+                return False
+
+            schema = {}
+            digests = {}
+            for path, (_, tables, file_digests) in files.items():
+                for name, spec in tables.items():
+                    if name in schema:
+                        raise ValueError(f"Object '{name}' is defined in more than one schema file")
+                    schema[name] = spec
+                    digests[name] = file_digests[name]
+
+            compiled = CompiledSchema(schema, previous=self._current, digests=digests)
+            self._files = files
+            if self._current is not None and compiled.version == self._current.version:
+                return False
+            self._current = compiled
+            logger.info("Loaded schema version %s (%d objects)", compiled.version, len(compiled.tables))
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the last good version until the files are fixed; report each
+                # distinct failure once rather than on every poll
+                if str(e) != str(self.last_error):
+                    logger.exception("Schema reload failed, keeping version %s", self.version)
+                self.last_error = e
+            else:
+                self.last_error = None
+
+    def start(self):
+        """Watches the files from a daemon thread, polling every `poll_interval` seconds."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="schema-registry", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
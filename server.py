@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from batch import _init_worker, _transform_in_worker, _transform_one
+from compiled_schema import compile_schema
+from permissions import PermissionContext
+from query_cache import use_disk_cache
+from schema_registry import SchemaRegistry
+
+logger = logging.getLogger("sql_parser.server")
+
+# Longest request line accepted, in bytes
+LINE_LIMIT = 1 << 24
+
+
+def decode_options(options):
+    # JSON options as transform_query takes them: "permissions" arrives as a dict
+    options = dict(options or {})
+    if isinstance(options.get("permissions"), dict):
+        options["permissions"] = PermissionContext(**options["permissions"])
+    return options
+
+
+class RewriteServer:
+    """
+    Serves transform_query over a JSON line protocol.
+
+    Every request line is {"id": ..., "query": "...", "options": {...}} and is answered,
+    possibly out of order, by {"id": ..., "sql": ..., "error": ...} plus "params" for
+    parameterized requests. Options are transform_query's keyword arguments.
+
+    Identical requests that arrive while one is being computed share its result. Rewrites
+    run in a pool of `workers` processes (threads when 0), one pool per schema version, so
+    requests finish on the version they started with when a SchemaRegistry reloads.
+
+    Args:
+        schema: Schema dict, CompiledSchema or SchemaRegistry.
+        workers (int): Worker processes; defaults to the CPU count.
+        max_pending (int): Rewrites queued or running at once. Requests beyond it are
+            answered with an "Overloaded" error right away so clients can back off.
+        max_inflight (int): Unanswered requests per connection. The server stops reading
+            from a connection that reaches it, so a fast client is slowed down by TCP/socket
+            flow control instead of growing the queue.
+        disk_cache (str): Path of a DiskCache behind the workers' template caches, so
+            restarted workers and new schema-version pools start warm.
+    """
+
+    def __init__(self, schema, workers=None, max_pending=1024, max_inflight=64, disk_cache=None):
+        self.registry = schema if isinstance(schema, SchemaRegistry) else None
+        self._schema = None if self.registry is not None else compile_schema(schema)
+        self.workers = os.cpu_count() if workers is None else workers
+        self.max_pending = max_pending
+        self.max_inflight = max_inflight
+        self.disk_cache = disk_cache
+        if disk_cache is not None and self.workers <= 0:
+            use_disk_cache(disk_cache)
+        self.coalesced = 0
+        self._computing = {}
+        self._pools = {}
+        # Schema version of the latest request; only its pool is kept once a new one starts
+        self._version = None
+        self._servers = []
+
+    def schema(self):
+        return self.registry.current() if self.registry is not None else self._schema
+
+    def _pool(self, schema):
+        # The pool for `schema`, or None for a version older than the latest request's whose
+        # pool is already gone: starting one would retire the current pool
+        pool = self._pools.get(schema.version)
+        if pool is not None or schema.version != self._version:
+            return pool
+        # Pools of older versions finish their queued work and are then shut down
+        for version in list(self._pools):
+            self._pools.pop(version).shutdown(wait=False)
+        if self.workers <= 0:
+            pool = ThreadPoolExecutor(max_workers=1)
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(schema, {}, self.disk_cache)
+            )
+        self._pools[schema.version] = pool
+        return pool
+
+    async def rewrite(self, query, options=None):
+        """Rewrites one query off the event loop, sharing the work with identical requests."""
+        schema = self.schema()
+        self._version = schema.version
+        key = (schema.version, query, json.dumps(options or {}, sort_keys=True, default=str))
+        task = self._computing.get(key)
+        if task is not None:
+            self.coalesced += 1
+        elif len(self._computing) >= self.max_pending:
+            return {"sql": None, "error": f"Overloaded: {len(self._computing)} rewrites pending"}
+        else:
+            # A task of its own, so a requester that disconnects does not cancel the others' result
+            task = self._computing[key] = asyncio.create_task(self._compute(schema, query, options))
+            task.add_done_callback(lambda _: self._computing.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _compute(self, schema, query, options):
+        loop = asyncio.get_running_loop()
+        pool = self._pool(schema)
+        try:
+            options = decode_options(options)
+            if pool is None:
+                # A straggler from before a reload: rewritten in a thread with its own schema
+                return await loop.run_in_executor(None, _transform_one, query, schema, options)
+            if self.workers <= 0:
+                return await loop.run_in_executor(pool, _transform_one, query, schema, options)
+            return await loop.run_in_executor(pool, _transform_in_worker, query, options)
+        except Exception as e:
+            return {"sql": None, "error": f"{type(e).__name__}: {e}"}
+
+    async def _answer(self, line, writer, lock, slots):
+        # The slot is only released once the response is written, so a client that does not
+        # read its responses stops getting new requests answered
+        try:
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get("id")
+                result = await self.rewrite(request["query"], request.get("options"))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                result = {"sql": None, "error": f"Bad request: {e}"}
+            except Exception as e:
+                result = {"sql": None, "error": f"{type(e).__name__}: {e}"}
+            response = {"id": request_id, **result}
+            async with lock:
+                writer.write(json.dumps(response, default=float).encode() + b"\n")
+                await writer.drain()
+        finally:
+            slots.release()
+
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+        slots = asyncio.Semaphore(self.max_inflight)
+        tasks = set()
+        try:
+            while True:
+                await slots.acquire()
+                line = await reader.readline()
+                if not line:
+                    slots.release()
+                    break
+                if not line.strip():
+                    slots.release()
+                    continue
+                task = asyncio.create_task(self._answer(line, writer, lock, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.warning("Dropping connection: %s", e)
+        finally:
+            writer.close()
+
+    async def start_unix(self, path):
+        server = await asyncio.start_unix_server(self.handle, path=path, limit=LINE_LIMIT)
+        self._servers.append(server)
+        return server
+
+    async def start_tcp(self, host="127.0.0.1", port=0):
+        server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+        self._pools = {}
+
+    def stats(self):
+        return {"pending": len(self._computing), "coalesced": self.coalesced}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the query rewriter over a JSON line protocol.")
+    parser.add_argument("--socket", help="Unix socket path to listen on")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host, used when --socket is not given")
+    parser.add_argument("--port", type=int, default=7878, help="TCP port (default: 7878)")
+    parser.add_argument("--schema", action="append",
+                        help="JSON or YAML schema file, repeatable (default: schema.py); files are watched")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between schema file checks")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count, 0 for a thread)")
+    parser.add_argument("--max-pending", type=int, default=1024, help="rewrites queued at once before rejecting")
+    parser.add_argument("--max-inflight", type=int, default=64, help="unanswered requests per connection")
+    parser.add_argument("--disk-cache", help="SQLite file of rewrite templates shared by the workers")
+    return parser.parse_args(argv)
+
+
+async def serve(args):
+    if args.schema:
+        schema = SchemaRegistry(args.schema, poll_interval=args.poll_interval).start()
+    else:
+        from schema import schema
+    server = RewriteServer(schema, args.workers, args.max_pending, args.max_inflight, args.disk_cache)
+    if args.socket:
+        listener = await server.start_unix(args.socket)
+    else:
+        listener = await server.start_tcp(args.host, args.port)
+    logger.info("Listening on %s", listener.sockets[0].getsockname())
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+from sqlglot import expressions as exp
+
+from optimizer import conjuncts
+from permissions import ownership_exists, plan_permissions
+
+STRATEGIES = ("in", "exists", "semi_join", "flat", "auto")
+
+
+class QueryPlan:
+    """
+    Everything an output strategy needs to emit the physical query.
+
+    `joins` reach the objects the WHERE clause filters on, `select_joins` the objects that
+    are only projected and `all_joins` both at once; all are JoinStep tuples. Ownership
+    checks for `permissions` are planned per emitted scope, sharing the `ctes` dict.
+    `outer_where` holds conditions on the root alone, which filter the outer query directly.
+
+    `explicit_joins` are the input's own JOINs as dicts with the joined "table" record,
+    "join_type" ("LEFT", "" for a plain JOIN, ...) and rewritten "on" condition; they are
+    kept on the outer query. `clauses` holds the rewritten outer clauses: "group", "order"
+    (lists), "having", "limit", "offset", "distinct" (None when absent) and the flags
+    "aggregated" (aggregates or window functions in the outer query) and "order_on_root"
+    (every ORDER BY key is computed from root columns alone).
+    """
+
+    __slots__ = (
+        "select",
+        "root",
+        "where",
+        "joins",
+        "select_joins",
+        "all_joins",
+        "permissions",
+        "outer_where",
+        "explicit_joins",
+        "clauses",
+        "ctes",
+    )
+
+    def __init__(
+        self,
+        select,
+        root,
+        where,
+        joins=(),
+        select_joins=(),
+        all_joins=(),
+        permissions=None,
+        outer_where=None,
+        explicit_joins=(),
+        clauses=None,
+    ):
+        self.select = select
+        self.root = root
+        self.where = where
+        self.joins = joins
+        self.select_joins = select_joins
+        self.all_joins = all_joins
+        self.permissions = permissions
+        self.outer_where = outer_where
+        self.explicit_joins = explicit_joins
+        self.clauses = clauses or {}
+        self.ctes = {}
+
+    @property
+    def fans_out(self):
+        # Joining the FK side of a relation can repeat root rows
+        return any(step.fan_out for step in self.joins)
+
+    def primary_key(self):
+        return exp.column(self.root.primary_key.physical_name, table=self.root.physical_name)
+
+    def ownership(self, steps, include_root=True):
+        # (filters, joins) restricting the rows of the root and the objects joined by `steps`
+        tables = ([self.root] if include_root else []) + [step.table for step in steps]
+        return plan_permissions(self.permissions, tables, self.ctes)
+
+    def needs_filter(self):
+        return self.where is not None or any(
+            self.permissions is not None and self.permissions.applies_to(table)
+            for table in [self.root] + [step.table for step in self.joins]
+        )
+
+    def limits_keys(self):
+        """
+        Whether ORDER BY/LIMIT/OFFSET can be applied to the matching keys instead of the
+        outer query, so only the first rows' keys are produced.
+
+        The outer query must return exactly one row per key: no joins or grouping there and
+        no fan-out in the key subquery. ORDER BY must not need anything the subquery lacks.
+        """
+        clauses = self.clauses
+        if clauses.get("limit") is None and clauses.get("offset") is None:
+            return False
+        if not self.needs_filter() or self.fans_out or self.select_joins or self.explicit_joins:
+            return False
+        if clauses.get("group") or clauses.get("having") is not None or clauses.get("distinct") is not None:
+            return False
+        return not clauses.get("aggregated") and (not clauses.get("order") or clauses.get("order_on_root"))
+
+
+def join_condition(step):
+    new, existing = step.on
+    return exp.column(new.physical_name, table=new.table.physical_name).eq(
+        exp.column(existing.physical_name, table=existing.table.physical_name)
+    )
+
+
+def join_clauses(steps):
+    return [(exp.to_table(step.table.physical_name), join_condition(step)) for step in steps]
+
+
+def add_joins(query, joins):
+    for table, on in joins:
+        query = query.join(table, on=on, copy=False)
+    return query
+
+
+def add_where(query, conditions):
+    if conditions:
+        query = query.where(exp.and_(*conditions, copy=False), copy=False)
+    return query
+
+
+def add_ctes(query, ctes):
+    for name, cte in ctes.items():
+        query = query.with_(name, as_=cte, copy=False)
+    return query
+
+
+def add_explicit_joins(query, plan):
+    # The input's own JOINs, with the ownership check of private objects in the ON clause so a
+    # LEFT JOIN stays a LEFT JOIN
+    for join in plan.explicit_joins:
+        table = join["table"]
+        conditions = [join["on"]] if join["on"] is not None else []
+        if plan.permissions is not None and plan.permissions.applies_to(table):
+            conditions.append(ownership_exists(table, plan.permissions))
+        on = exp.and_(*conditions, copy=False) if conditions else None
+        query = query.join(
+            exp.to_table(table.physical_name), on=on, join_type=join["join_type"] or None, copy=False
+        )
+    return query
+
+
+def add_clauses(query, plan, limited=False):
+    # GROUP BY, HAVING, ORDER BY, LIMIT, OFFSET and DISTINCT of the input. `limited` leaves out
+    # LIMIT and OFFSET, which the key subquery already applied.
+    clauses = plan.clauses
+    if clauses.get("distinct") is not None:
+        query.set("distinct", clauses["distinct"])
+    if clauses.get("group"):
+        query = query.group_by(*clauses["group"], copy=False)
+    if clauses.get("having") is not None:
+        query = query.having(clauses["having"], copy=False)
+    if clauses.get("order"):
+        query = query.order_by(*clauses["order"], copy=False)
+    if not limited:
+        if clauses.get("limit") is not None:
+            query = query.limit(clauses["limit"], copy=False)
+        if clauses.get("offset") is not None:
+            query = query.offset(clauses["offset"], copy=False)
+    return query
+
+
+def _outer_query(plan, conditions=(), limited=False):
+    # One WHERE for all outer conditions, so sqlglot does not parenthesise an earlier AND
+    query = exp.select(*plan.select, copy=False).from_(exp.to_table(plan.root.physical_name), copy=False)
+    query = add_explicit_joins(query, plan)
+    filters, semi_joins = plan.ownership(plan.select_joins, include_root=False)
+    query = add_joins(query, join_clauses(plan.select_joins) + semi_joins)
+    outer = [] if limited else _outer_conditions(plan)
+    return add_clauses(add_where(query, outer + filters + list(conditions)), plan, limited)
+
+
+def _outer_conditions(plan):
+    return conjuncts(plan.outer_where) if plan.outer_where is not None else []
+
+
+def _conditions(plan, filters):
+    return ([plan.where] if plan.where is not None else []) + filters
+
+
+def _matching_keys(plan, limited=False):
+    # SELECT DISTINCT root.pk AS id FROM root [JOIN ...] WHERE ...
+    filters, semi_joins = plan.ownership(plan.joins)
+    subquery = exp.select(exp.alias_(plan.primary_key(), "id"), copy=False)
+    if not limited:
+        subquery = subquery.distinct(copy=False)
+    subquery = subquery.from_(exp.to_table(plan.root.physical_name), copy=False)
+    subquery = add_joins(subquery, join_clauses(plan.joins) + semi_joins)
+    if not limited:
+        return add_where(subquery, _conditions(plan, filters))
+
+    # Top-N: no join repeats a key, so DISTINCT is not needed and the first rows' keys are
+    # all the outer query reads. Root-only conditions have to apply before the LIMIT as well.
+    subquery = add_where(subquery, _outer_conditions(plan) + _conditions(plan, filters))
+    clauses = plan.clauses
+    if clauses.get("order"):
+        subquery = subquery.order_by(*(ordered.copy() for ordered in clauses["order"]), copy=False)
+    if clauses.get("limit") is not None:
+        subquery = subquery.limit(clauses["limit"].copy(), copy=False)
+    if clauses.get("offset") is not None:
+        subquery = subquery.offset(clauses["offset"].copy(), copy=False)
+    return subquery
+
+
+def emit_in(plan):
+    # SELECT ... FROM root WHERE root.pk IN (SELECT DISTINCT root.pk AS id FROM root [JOIN ...] WHERE ...)
+    conditions = []
+    limited = plan.limits_keys()
+    if plan.needs_filter():
+        keys = _matching_keys(plan, limited)
+        if limited:
+            # Some databases (MySQL) reject LIMIT directly inside IN (...), but not in a derived table
+            keys = exp.select(exp.column("id", table="matched")).from_(keys.subquery("matched", copy=False), copy=False)
+        conditions.append(plan.primary_key().isin(query=keys, copy=False))
+    return add_ctes(_outer_query(plan, conditions, limited), plan.ctes)
+
+
+def emit_semi_join(plan):
+    # SELECT ... FROM root JOIN (SELECT DISTINCT root.pk AS id ...) AS matched ON matched.id = root.pk
+    limited = plan.limits_keys()
+    query = exp.select(*plan.select, copy=False).from_(exp.to_table(plan.root.physical_name), copy=False)
+    if plan.needs_filter():
+        matched = _matching_keys(plan, limited).subquery("matched", copy=False)
+        query = query.join(matched, on=exp.column("id", table="matched").eq(plan.primary_key()), copy=False)
+    query = add_explicit_joins(query, plan)
+    filters, semi_joins = plan.ownership(plan.select_joins, include_root=False)
+    query = add_joins(query, join_clauses(plan.select_joins) + semi_joins)
+    query = add_where(query, ([] if limited else _outer_conditions(plan)) + filters)
+    if plan.needs_filter():
+        _qualify_stars(query)
+    return add_ctes(add_clauses(query, plan, limited), plan.ctes)
+
+
+def _qualify_stars(query):
+    # SELECT * would return matched.id as well: select every other object's columns instead
+    tables = [query.args["from_"].this] + [join.this for join in query.args.get("joins") or ()]
+    stars = [
+        exp.column(exp.Star(), table=table.alias_or_name)
+        for table in tables
+        if table.alias_or_name != "matched"
+    ]
+    expressions = []
+    for expression in query.expressions:
+        if isinstance(expression, exp.Star):
+            expressions.extend(star.copy() for star in stars)
+        else:
+            expressions.append(expression)
+    query.set("expressions", expressions)
+
+
+def emit_exists(plan):
+    # SELECT ... FROM root WHERE EXISTS (SELECT 1 FROM <joined objects> WHERE <join to root> AND ...)
+    if not plan.joins:
+        return emit_flat(plan)
+    first, *rest = plan.joins
+    filters, semi_joins = plan.ownership(plan.joins)
+    subquery = exp.select("1").from_(exp.to_table(first.table.physical_name), copy=False)
+    subquery = add_joins(subquery, join_clauses(rest) + semi_joins)
+    # Root columns inside the subquery refer to the outer row, so the root needs no self-join
+    subquery = add_where(subquery, [join_condition(first)] + _conditions(plan, filters))
+    return add_ctes(_outer_query(plan, [exp.Exists(this=subquery)]), plan.ctes)
+
+
+def emit_flat(plan):
+    # SELECT ... FROM root [JOIN ...] WHERE ...: only valid when no join can repeat root rows
+    if plan.fans_out:
+        fan_out = next(step for step in plan.joins if step.fan_out)
+        raise ValueError(
+            f"Flat output would repeat '{plan.root.name}' rows: '{fan_out.table.name}' holds the foreign key"
+        )
+    filters, semi_joins = plan.ownership(plan.all_joins)
+    query = exp.select(*plan.select, copy=False).from_(exp.to_table(plan.root.physical_name), copy=False)
+    query = add_explicit_joins(query, plan)
+    query = add_joins(query, join_clauses(plan.all_joins) + semi_joins)
+    query = add_where(query, _outer_conditions(plan) + _conditions(plan, filters))
+    return add_ctes(add_clauses(query, plan), plan.ctes)
+
+
+def choose_strategy(plan):
+    # No fan-out: filter the rows directly. Fan-out: EXISTS stops at the first match per root
+    # row instead of materialising and de-duplicating every matching key.
+    if not plan.needs_filter() or not plan.fans_out:
+        return "flat"
+    return "exists"
+
+
+EMITTERS = {
+    "in": emit_in,
+    "exists": emit_exists,
+    "semi_join": emit_semi_join,
+    "flat": emit_flat,
+}
+
+
+def emit(plan, strategy="in"):
+    if strategy == "auto":
+        strategy = choose_strategy(plan)
+    try:
+        emitter = EMITTERS[strategy]
+    except KeyError:
+        raise ValueError(f"Unknown strategy '{strategy}', expected one of {STRATEGIES}") from None
+    return emitter(plan)
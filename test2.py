@@ -1,5 +1,6 @@
 import sqlglot
 from sqlglot import expressions as exp
+from schema import schema
 
 def extract_operators(expression):
     operators = []
@@ -196,64 +197,6 @@ def transform_query(input_query, schema, hierarchy):
         print("present tables-->",present_tables)
         print("transformed select-->",transformed_select)
 
-schema = {
-    "users": {
-        "physical_name": "user_master",
-        "is_public": False,
-        "columns": {
-            "id": "user_id",
-            "spending": "total_spend",
-            "budget": "spend_limit",
-            "status": "user_status",
-            "name": "user_name",
-            "orders": {
-                "relation": {"object": "orders", "column": "user_id", "virtual": True},
-            },
-        },
-    },
-    "orders": {
-        "physical_name": "order_details",
-        "is_public": True,
-        "columns": {
-            "id": "order_id",
-            "amount": "order_amount",
-            "status": "order_status",
-            "user_id": {
-                "relation": {"object": "users", "column": "id", "virtual": False},
-            },
-            "items": {
-                "relation": {"object": "items", "column": "order_id", "virtual": True},
-            },
-        },
-    },
-    "items": {
-        "physical_name": "order_item_details",
-        "is_public": True,
-        "columns": {
-            "id": "item_id",
-            "order_id": {
-                "relation": {"object": "orders", "column": "id", "virtual": False},
-            },
-            "product_id": "product_id",
-            "quantity": "item_quantity",
-            "category": {
-                "relation": {"object": "categories", "column": "id", "virtual": False},
-            },
-        },
-    },
-    "categories": {
-        "physical_name": "category_master",
-        "is_public": True,
-        "columns": {
-            "id": "category_id",
-            "name": "category_name",
-            "items": {
-                "relation": {"object": "items", "column": "category", "virtual": True},
-            },
-        },
-    },
-}
-
 heirarchy = {
     "users": 1,
     "orders": 2,
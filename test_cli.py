@@ -0,0 +1,31 @@
+import io
+
+from cli import iter_statements, parse_args, run
+
+
+def test_unterminated_string_after_statement():
+    chunks = ["SELECT a FROM t WHERE x = 1; SELECT 'abc"]
+    assert list(iter_statements(chunks)) == ["SELECT a FROM t WHERE x = 1", "SELECT 'abc"]
+
+
+def test_semicolon_inside_string_across_chunks():
+    chunks = ["SELECT 'a", "b;c' FROM t; SELECT", " 2;"]
+    assert list(iter_statements(chunks)) == ["SELECT 'ab;c' FROM t", "SELECT 2"]
+
+
+def test_unterminated_string_is_capped():
+    chunks = ["SELECT 1; SELECT 'abc; "] + ["SELECT 2; "] * 20 + ["SELECT 'q'; SELECT 4;"]
+    statements = list(iter_statements(chunks, max_size=64))
+    assert statements[0] == "SELECT 1"
+    assert statements[1].startswith("SELECT 'abc;")
+    assert all(len(statement) <= 64 + len("SELECT 2; ") for statement in statements)
+    assert statements[-2:] == ["SELECT 'q'", "SELECT 4"]
+
+
+def test_run_reports_unterminated_string(tmp_path):
+    path = tmp_path / "input.sql"
+    path.write_text("SELECT name FROM users WHERE id = 1; SELECT 'abc")
+    stdout, stderr = io.StringIO(), io.StringIO()
+    assert run(parse_args([str(path)]), stdout, stderr) == 1
+    assert stdout.getvalue().startswith("SELECT user_master.user_name FROM user_master")
+    assert stderr.getvalue().startswith("statement 1: TokenError")
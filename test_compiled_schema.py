@@ -0,0 +1,18 @@
+import compiled_schema
+from compiled_schema import compile_schema
+
+
+def spec(**options):
+    return {"t": {"physical_name": "t_table", "columns": {"id": "t_id"}, **options}}
+
+
+def test_objects_are_private_by_default():
+    assert compile_schema(spec()).table("t").is_public is False
+    assert compile_schema(spec(is_public=True)).table("t").is_public is True
+
+
+def test_compiled_cache_is_bounded():
+    schemas = [spec() for _ in range(compiled_schema.COMPILED_CACHE_SIZE * 2)]
+    for schema in schemas:
+        assert compile_schema(schema) is compile_schema(schema)
+    assert len(compiled_schema._compiled) == compiled_schema.COMPILED_CACHE_SIZE
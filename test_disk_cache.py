@@ -0,0 +1,18 @@
+import sqlite3
+
+from disk_cache import DiskCache
+
+
+def test_get_returns_value_when_touch_is_locked(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = DiskCache(path, timeout=0.05)
+    cache.put(("key",), ("value", 1))
+    blocker = sqlite3.connect(path)
+    blocker.execute("UPDATE entries SET used = 0")
+    blocker.commit()
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        assert cache.get(("key",)) == ("value", 1)
+    finally:
+        blocker.rollback()
+    assert cache.errors == 1
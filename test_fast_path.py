@@ -0,0 +1,94 @@
+import random
+
+from compiled_schema import compile_schema
+from fast_path import STRATEGIES, fast_transform
+from main import transform_query
+from schema import schema
+
+# Random queries per run; the seed is fixed so a failure reproduces
+QUERY_COUNT = 1000
+SEED = 0
+OPERATORS = ("=", "!=", "<>", "<", ">", "<=", ">=")
+CONSTANTS = (
+    "5", "0", "42.50", "007", "-3", "- 3", "-0.5", "1e3", ".5", "0x1F",
+    "'active'", "''", "'it''s'", "'back\\slash'", "'line\nbreak'", "'ünïcode'", "'x -- y'",
+    "?", ":name", ":p0", "NULL", "TRUE", "x",
+)
+
+
+def _keyword(word, generator):
+    return generator.choice((word, word.lower(), word.capitalize()))
+
+
+def random_query(schema, generator):
+    """
+    A query of the fast path's shape, or a near miss: random columns, operators, constants,
+    keyword case and spacing, with the occasional relation, unknown or qualified column,
+    comment, trailing semicolon or clause the fast path does not take.
+    """
+    table = generator.choice(list(schema.tables.values()))
+    plain = [name for name, column in table.columns.items() if not column.is_relation]
+    others = [name for name, column in table.columns.items() if column.is_relation] + ["missing", f"{table.name}.id", "*"]
+
+    def column():
+        return generator.choice(others) if generator.random() < 0.05 else generator.choice(plain)
+
+    def space():
+        return generator.choice((" ", " ", "  ", "\n", "\t"))
+
+    select = f",{space()}".join(column() for _ in range(generator.randint(1, 4)))
+    query = f"{_keyword('SELECT', generator)}{space()}{select}{space()}{_keyword('FROM', generator)}{space()}{table.name}"
+    predicates = generator.randint(0, 5)
+    for index in range(predicates):
+        word = "WHERE" if index == 0 else generator.choice(("AND", "AND", "OR"))
+        predicate = f"{column()}{generator.choice(('', ' '))}{generator.choice(OPERATORS)}{space()}{generator.choice(CONSTANTS)}"
+        query += f"{space()}{_keyword(word, generator)}{space()}{predicate}"
+    roll = generator.random()
+    if roll < 0.03:
+        query += " -- note"
+    elif roll < 0.06:
+        query += ";"
+    elif roll < 0.09:
+        query += " LIMIT 10"
+    elif roll < 0.12 and predicates:
+        query += f" AND {generator.choice(plain)} IN (1, 2)"
+    return query
+
+
+def full_path(query, schema, strategy):
+    try:
+        return transform_query(query, schema, strategy=strategy, fast_path=False)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def mismatches(queries, schema, strategies=STRATEGIES):
+    """
+    Rewrites every query with and without the fast path, under every strategy.
+
+    Returns:
+        tuple: (rewrites the fast path took, [(query, strategy, fast output, full output)] for
+        those that differ from the full path).
+    """
+    schema = compile_schema(schema)
+    taken = 0
+    different = []
+    for query in queries:
+        for strategy in strategies:
+            fast = fast_transform(query, schema, strategy)
+            if fast is None:
+                continue
+            taken += 1
+            full = full_path(query, schema, strategy)
+            if fast != full:
+                different.append((query, strategy, fast, full))
+    return taken, different
+
+
+def test_fast_path_matches_full_path():
+    compiled = compile_schema(schema)
+    generator = random.Random(SEED)
+    queries = [random_query(compiled, generator) for _ in range(QUERY_COUNT)]
+    taken, different = mismatches(queries, compiled)
+    assert taken
+    assert different == []
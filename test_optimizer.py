@@ -0,0 +1,41 @@
+import sys
+
+from sqlglot import expressions as exp
+
+from bench_depth import alternating
+from dialects import parse_one
+from optimizer import normalize
+
+
+def simplify(condition, or_to_in=False):
+    result = normalize(parse_one(f"SELECT * FROM t WHERE {condition}").args["where"].this, or_to_in)
+    return result.sql() if result is not None else None
+
+
+def test_or_to_in_keeps_column_comparisons():
+    assert simplify("x = 1 OR x = 2 OR x = 3 OR x = y", or_to_in=True) == "x IN (1, 2, 3) OR x = y"
+
+
+def test_or_to_in_keeps_subqueries():
+    assert (
+        simplify("x = 1 OR x = 2 OR x = 3 OR x IN (SELECT y FROM u)", or_to_in=True)
+        == "x IN (1, 2, 3) OR x IN (SELECT y FROM u)"
+    )
+
+
+def test_or_to_in_merges_constant_lists():
+    assert simplify("x = 1 OR 2 = x OR x IN (3, 4) OR y = 1", or_to_in=True) == "x IN (1, 2, 3, 4) OR y = 1"
+
+
+def test_merge_ranges_keeps_bare_column():
+    assert simplify("x AND x > 5 AND x > 3") == "x AND x > 5"
+
+
+def test_merge_ranges_contradiction():
+    assert simplify("x > 5 AND x < 3") == "FALSE"
+
+
+def test_alternating_nesting_deeper_than_recursion_limit():
+    depth = sys.getrecursionlimit() * 2
+    result = normalize(alternating(depth))
+    assert isinstance(result, (exp.And, exp.Or))
@@ -0,0 +1,48 @@
+import pytest
+from sqlglot.errors import ParseError
+
+from main import transform_query
+from query_cache import QueryCache, cached_transform_query
+from schema import schema
+
+# Queries of one shape in a row, so the later ones are rewritten from the cached template
+QUERIES = [
+    "SELECT name FROM users WHERE id = 1",
+    "SELECT name FROM users WHERE id = 2",
+    "SELECT name FROM users WHERE created_at > NOW() - INTERVAL '1' DAY",
+    "SELECT name FROM users WHERE created_at > NOW() - INTERVAL '7' DAY",
+    "SELECT name FROM users WHERE id = 1 ORDER BY 1 LIMIT 10",
+    "SELECT name FROM users WHERE id = 2 ORDER BY 1 LIMIT 5",
+    "SELECT name FROM users WHERE CAST(id AS DECIMAL(10, 2)) > 5",
+    "SELECT name FROM users WHERE CAST(id AS DECIMAL(12, 4)) > 6",
+]
+
+
+def rewrite(transform, query, **options):
+    try:
+        return transform(query, schema, **options)
+    except ParseError as e:
+        return f"ParseError: {e}"
+
+
+def test_cached_matches_uncached():
+    cache = QueryCache()
+    for query in QUERIES:
+        cached = rewrite(lambda *args, **options: cached_transform_query(*args, cache=cache, **options), query)
+        assert cached == rewrite(transform_query, query)
+    assert cache.hits
+
+
+def test_parse_error_is_not_cached_away():
+    cache = QueryCache()
+    for _ in range(2):
+        with pytest.raises(ParseError):
+            cached_transform_query("SELECT name FROM users WHERE id = 0x1F", schema, cache=cache)
+
+
+@pytest.mark.parametrize("write", ["tsql", "mysql", "postgres", "bigquery", ["tsql", "postgres"]])
+def test_cached_matches_uncached_per_dialect(write):
+    cache = QueryCache()
+    for query in QUERIES:
+        cached = rewrite(lambda *args, **options: cached_transform_query(*args, cache=cache, **options), query, write=write)
+        assert cached == rewrite(transform_query, query, write=write)
@@ -0,0 +1,7 @@
+from query_info import QueryInfo
+
+
+def test_select_keeps_duplicate_names():
+    info = QueryInfo("SELECT COUNT(*), COUNT(*), users.name, orders.name, total AS n FROM users JOIN orders ON orders.user_id = users.id")
+    assert [name for name, _ in info.select] == ["*", "*", "name", "name", "n"]
+    assert [expression.sql() for _, expression in info.select][:4] == ["COUNT(*)", "COUNT(*)", "users.name", "orders.name"]
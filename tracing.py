@@ -0,0 +1,67 @@
+import itertools
+import logging
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+logger = logging.getLogger("sql_parser.trace")
+
+# The active Tracer, or None. Instrumented code only pays for an `is not None` check while off.
+active = None
+
+
+class Tracer:
+    """
+    Records per-phase timings of transform_query as structured events.
+
+    Events are dicts {"query": n, "phase": name, "seconds": duration} kept in a ring buffer of
+    `buffer_size` entries and, when `log` is set, also emitted to the "sql_parser.trace" logger.
+    """
+
+    def __init__(self, buffer_size=1024, log=False):
+        self.events = deque(maxlen=buffer_size)
+        self.log = log
+        self._ids = itertools.count()
+
+    def start(self):
+        # Returns (query id, timestamp) for the first `record` call of a query
+        return next(self._ids), perf_counter()
+
+    def record(self, mark, phase):
+        query, started = mark
+        now = perf_counter()
+        event = {"query": query, "phase": phase, "seconds": now - started}
+        self.events.append(event)
+        if self.log:
+            logger.debug("query=%d phase=%s seconds=%.6f", query, phase, event["seconds"], extra={"trace": event})
+        return query, now
+
+    def summary(self):
+        # Total seconds and call count per phase over the buffered events
+        totals = {}
+        for event in self.events:
+            seconds, count = totals.get(event["phase"], (0.0, 0))
+            totals[event["phase"]] = (seconds + event["seconds"], count + 1)
+        return {phase: {"seconds": seconds, "count": count} for phase, (seconds, count) in totals.items()}
+
+
+def enable_tracing(buffer_size=1024, log=False):
+    global active
+    active = Tracer(buffer_size, log)
+    return active
+
+
+def disable_tracing():
+    global active
+    active = None
+
+
+@contextmanager
+def traced(buffer_size=1024, log=False):
+    global active
+    previous = active
+    tracer = enable_tracing(buffer_size, log)
+    try:
+        yield tracer
+    finally:
+        active = previous